@@ -0,0 +1,94 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+# Chat requests answered at once; up to CHAT_MAX_QUEUED more wait for a slot
+MAX_IN_FLIGHT = int(os.getenv("CHAT_MAX_IN_FLIGHT", "64"))
+MAX_QUEUED = int(os.getenv("CHAT_MAX_QUEUED", "64"))
+# Time budget of one chat request, from arrival to answer
+DEADLINE_MS = float(os.getenv("CHAT_DEADLINE_MS", "2000"))
+RETRY_AFTER_SECONDS = 1
+
+
+class Overloaded(Exception):
+    """A request shed to protect the others; ``reason`` is queue_full or deadline."""
+
+    def __init__(self, reason):
+        super().__init__("Server is busy, retry shortly.")
+        self.reason = reason
+
+def new_deadline():
+    return time.monotonic() + DEADLINE_MS / 1000
+
+async def run_to_completion(func, *args):
+    """``asyncio.to_thread(func, *args)`` that outlives its caller's cancellation.
+
+    A worker thread cannot be stopped, so a cancelled request waits here
+    until ``func`` returns before the cancellation goes on; code releasing
+    an admission slot afterwards then never lets more work run than the
+    slots allow.
+    """
+    work = asyncio.ensure_future(asyncio.to_thread(func, *args))
+    try:
+        return await asyncio.shield(work)
+    except asyncio.CancelledError:
+        await asyncio.wait([work])
+        raise
+
+
+class AdmissionController:
+    """Caps concurrent chat requests, with a bounded line of waiting ones.
+
+    Requests beyond ``max_in_flight`` wait for a slot, but only up to
+    ``max_queued`` of them and only until their deadline. The rest fail
+    straight away with Overloaded, which the server turns into a 503 with
+    Retry-After, instead of piling up behind a backlog they cannot beat.
+    """
+
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, max_queued=MAX_QUEUED):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queued = 0
+        self._slots = None
+
+    async def acquire(self, deadline):
+        """Wait for a slot; returns the function that gives it back.
+
+        Releasing twice is harmless, so a streamed response can release from
+        both its body and its background task, whichever runs.
+        """
+        if self._slots is None:
+            # Created on first use so it belongs to the server's event loop
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        if not self._slots.locked():
+            await self._slots.acquire()
+            return self._releaser()
+        if self.queued >= self.max_queued:
+            raise Overloaded("queue_full")
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), deadline - time.monotonic())
+        except asyncio.TimeoutError:
+            raise Overloaded("deadline") from None
+        finally:
+            self.queued -= 1
+        return self._releaser()
+
+    def _releaser(self):
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self._slots.release()
+        return release
+
+    @asynccontextmanager
+    async def admit(self, deadline):
+        release = await self.acquire(deadline)
+        try:
+            yield
+        finally:
+            release()
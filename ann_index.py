@@ -0,0 +1,190 @@
+import argparse
+import json
+import logging
+import math
+import os
+import time
+import faiss
+import numpy as np
+from atomic_files import replacing
+from index_store import MMAP_FLAGS, store_version
+
+logger = logging.getLogger(__name__)
+
+# flat | ivf | hnsw | sq8 | ivf_sq8 | ivf_pq | hnsw_sq8
+INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+NPROBE = int(os.getenv("FAISS_NPROBE", "8"))
+EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+# Vectors used to train IVF / quantizers; more only slows the build down
+MAX_TRAINING_VECTORS = 100_000
+
+def factory_string(index_type, n_vectors, dim):
+    """faiss.index_factory description for ``index_type`` at this corpus size."""
+    nlist = max(1, min(4096, int(4 * math.sqrt(n_vectors)), n_vectors))
+    # PQ needs a sub-quantizer count that divides the dimension (48 for MiniLM)
+    # and at least 2**nbits training vectors
+    pq_m = next(m for m in (48, 32, 24, 16, 12, 8, 4, 2, 1) if dim % m == 0)
+    pq_nbits = max(1, min(8, int(math.log2(max(n_vectors, 2)))))
+    strings = {
+        "flat": "Flat",
+        "ivf": f"IVF{nlist},Flat",
+        "hnsw": "HNSW32",
+        "sq8": "SQ8",
+        "ivf_sq8": f"IVF{nlist},SQ8",
+        "ivf_pq": f"IVF{nlist},PQ{pq_m}x{pq_nbits}",
+        "hnsw_sq8": "HNSW32_SQ8",
+    }
+    if index_type not in strings:
+        raise ValueError(f"❗ Unknown FAISS index type '{index_type}', expected one of {sorted(strings)}.")
+    return strings[index_type]
+
+def all_vectors(index):
+    return index.reconstruct_n(0, index.ntotal)
+
+def build_ann_index(flat_index, index_type):
+    """Train and fill an ``index_type`` index with the vectors of ``flat_index``.
+
+    Rows keep their positions, so the LangChain index_to_docstore_id mapping
+    of the flat index stays valid.
+    """
+    vectors = all_vectors(flat_index)
+    index = faiss.index_factory(flat_index.d, factory_string(index_type, len(vectors), flat_index.d), faiss.METRIC_L2)
+    if not index.is_trained:
+        sample = vectors
+        if len(vectors) > MAX_TRAINING_VECTORS:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(len(vectors), MAX_TRAINING_VECTORS, replace=False)]
+        index.train(sample)
+    index.add(vectors)
+    configure_search(index)
+    return index
+
+def configure_search(index, nprobe=NPROBE, ef_search=EF_SEARCH):
+    """Apply the query-time knobs (nprobe for IVF, efSearch for HNSW)."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = nprobe
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+    return index
+
+def search_parameters(index, selector, nprobe=NPROBE, ef_search=EF_SEARCH):
+    """SearchParameters of the right subclass for ``index`` with an ID selector.
+
+    IVF and HNSW indexes reject the generic SearchParameters, and parameters
+    passed per search override the ones set on the index.
+    """
+    if faiss.try_extract_index_ivf(index) is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search)
+    return faiss.SearchParameters(sel=selector)
+
+def ann_path(index_path, index_type):
+    return os.path.join(index_path, f"ann_{index_type}.faiss")
+
+def save_ann_index(index, index_path, index_type, version):
+    os.makedirs(index_path, exist_ok=True)
+    path = ann_path(index_path, index_type)
+    with replacing(path, path + ".json") as (tmp_path, meta_path):
+        faiss.write_index(index, tmp_path)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"source_version": version, "ntotal": index.ntotal}, f)
+
+def load_ann_index(flat_index, index_path, index_type=INDEX_TYPE, version=None):
+    """Return the saved ``index_type`` index derived from ``flat_index``, or None if it is stale.
+
+    ``version`` is the store version of ``flat_index``, by default that of
+    the store saved in ``index_path``.
+    """
+    if index_type == "flat":
+        return flat_index
+    version = version if version is not None else store_version(index_path)
+    meta_path = ann_path(index_path, index_type) + ".json"
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta["source_version"] != version or meta["ntotal"] != flat_index.ntotal:
+        return None
+    logger.info("💾 Loading %s FAISS index...", index_type)
+    return configure_search(faiss.read_index(ann_path(index_path, index_type), MMAP_FLAGS))
+
+def load_or_build_ann_index(flat_index, index_path, index_type=INDEX_TYPE, version=None):
+    """Return the ``index_type`` index for the flat index saved in ``index_path``.
+
+    The flat index stays the source of truth for incremental updates (HNSW
+    cannot remove vectors); the ANN index is derived from it and tagged with
+    its store version so it is retrained whenever the flat index changes.
+    Builders pass the ``version`` they are about to save the store under.
+    """
+    if index_type == "flat":
+        return flat_index
+    version = version if version is not None else store_version(index_path)
+    index = load_ann_index(flat_index, index_path, index_type, version)
+    if index is not None:
+        return index
+
+    logger.info("🏗️ Training %s FAISS index on %d vectors...", index_type, flat_index.ntotal)
+    index = build_ann_index(flat_index, index_type)
+    save_ann_index(index, index_path, index_type, version)
+    return index
+
+def recall_report(flat_index, index_types, k=5, n_queries=200, nprobes=(1, 4, 8, 16, 32), ef_searches=(16, 32, 64, 128)):
+    """Recall@k and per-query latency of each index type against exact search.
+
+    Queries are a random sample of the indexed vectors, which is what the
+    sentence-embedding queries look like to the index.
+    """
+    vectors = all_vectors(flat_index)
+    rng = np.random.default_rng(0)
+    queries = vectors[rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False)]
+
+    def timed_search(index):
+        started = time.perf_counter()
+        _, rows = index.search(queries, k)
+        return rows, (time.perf_counter() - started) * 1000 / len(queries)
+
+    exact_rows, exact_ms = timed_search(flat_index)
+    results = [{"index_type": "flat", "setting": "-", "recall": 1.0, "ms_per_query": exact_ms,
+                "bytes": len(faiss.serialize_index(flat_index))}]
+    for index_type in index_types:
+        if index_type == "flat":
+            continue
+        index = build_ann_index(flat_index, index_type)
+        size = len(faiss.serialize_index(index))
+        if faiss.try_extract_index_ivf(index) is not None:
+            settings = [("nprobe", n, dict(nprobe=n)) for n in nprobes]
+        elif isinstance(index, faiss.IndexHNSW):
+            settings = [("efSearch", ef, dict(ef_search=ef)) for ef in ef_searches]
+        else:
+            settings = [("-", "", {})]
+        for name, value, knobs in settings:
+            configure_search(index, **knobs)
+            rows, ms = timed_search(index)
+            recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(rows, exact_rows)])
+            results.append({"index_type": index_type, "setting": f"{name}={value}" if value != "" else "-",
+                            "recall": float(recall), "ms_per_query": ms, "bytes": size})
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs. latency of FAISS index types against the exact index.")
+    parser.add_argument("--index", default="faiss_index", help="Folder with index.faiss")
+    parser.add_argument("--types", default="ivf,hnsw,sq8,ivf_sq8,ivf_pq,hnsw_sq8")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    flat_index = faiss.read_index(os.path.join(args.index, "index.faiss"))
+    results = recall_report(flat_index, args.types.split(","), k=args.k, n_queries=args.queries)
+    print(f"{'index':<10} {'setting':<14} {'recall@' + str(args.k):>9} {'ms/query':>9} {'MB':>8}")
+    for r in results:
+        print(f"{r['index_type']:<10} {r['setting']:<14} {r['recall']:>9.3f} {r['ms_per_query']:>9.3f} {r['bytes'] / 1e6:>8.2f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+@contextmanager
+def replacing(*paths):
+    """Yield a temporary path beside each of ``paths`` and swap them in on success.
+
+    The temporary names are unique, so processes saving the same files at
+    the same time never write into each other's; the last one to finish
+    wins, with whole files. Readers see the old file or the new one, never a
+    partial write, and anything already memory-mapped keeps its old copy.
+    The files are replaced in the order given. On error they are removed and
+    ``paths`` are left as they were.
+    """
+    tmp_paths = []
+    try:
+        for path in paths:
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp"
+            )
+            os.close(fd)
+            # mkstemp creates 0600 files; the indexes are read by other users too
+            os.chmod(tmp_path, 0o644)
+            tmp_paths.append(tmp_path)
+        yield tmp_paths
+        for tmp_path, path in zip(tmp_paths, paths):
+            os.replace(tmp_path, path)
+    finally:
+        for tmp_path in tmp_paths:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
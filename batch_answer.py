@@ -0,0 +1,88 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+logger = logging.getLogger("batch_answer")
+
+# Queries per get_responses call: one encode and one FAISS search each
+BATCH_ANSWER_SIZE = int(os.getenv("BATCH_ANSWER_SIZE", "64"))
+
+def load_questions(path, field=None, id_field=None):
+    """``(id, query)`` pairs from a JSONL file, in file order.
+
+    The query is ``field`` or, by default, the first of ``query``,
+    ``question``, ``body`` and ``title`` present in a record; the id is
+    ``id_field`` or the first of ``id`` and ``request_id``, falling back to
+    the line number.
+    """
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if field:
+                query = record.get(field, "")
+            else:
+                query = next((record[k] for k in ("query", "question", "body", "title") if record.get(k)), "")
+            if id_field:
+                question_id = record.get(id_field, line_number)
+            else:
+                question_id = next((record[k] for k in ("id", "request_id") if k in record), line_number)
+            questions.append((question_id, query))
+    return questions
+
+def answer_batch_at(engine, queries, start, batch_size=BATCH_ANSWER_SIZE, deadline=None):
+    """``[(index, query, response), ...]`` for the batch of ``queries`` starting at ``start``.
+
+    Batches bypass the response cache; see RAGEngine.get_responses. Past
+    ``deadline`` the answers skip re-ranking, as for a single query.
+    """
+    batch = queries[start:start + batch_size]
+    deadlines = None if deadline is None else [deadline] * len(batch)
+    responses = engine.get_responses(batch, use_cache=False, deadlines=deadlines)
+    return [(start + i, query, response) for i, (query, response) in enumerate(zip(batch, responses))]
+
+def iter_answer_batches(engine, queries, batch_size=BATCH_ANSWER_SIZE):
+    """Yield answer_batch_at() for each batch of ``queries`` as it completes."""
+    for start in range(0, len(queries), batch_size):
+        yield answer_batch_at(engine, queries, start, batch_size)
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions in batches, writing JSONL.")
+    parser.add_argument("input", help="JSONL file of questions")
+    parser.add_argument("--output", help="JSONL file for the answers (default: stdout)")
+    parser.add_argument("--field", help="Field holding the question")
+    parser.add_argument("--id-field", help="Field holding the question id")
+    parser.add_argument("--batch-size", type=int, default=BATCH_ANSWER_SIZE)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    from rag import engine
+
+    questions = load_questions(args.input, args.field, args.id_field)
+    engine.warm_up()
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    started = time.perf_counter()
+    answered = 0
+    try:
+        for batch in iter_answer_batches(engine, [query for _, query in questions], args.batch_size):
+            for i, query, response in batch:
+                out.write(json.dumps({"id": questions[i][0], "query": query, **response}, ensure_ascii=False) + "\n")
+            out.flush()
+            answered += len(batch)
+            elapsed = time.perf_counter() - started
+            logger.info("✅ %d/%d answered (%.1f queries/s)", answered, len(questions), answered / elapsed)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - started
+    logger.info("🏁 Answered %d questions in %.1fs (%.1f queries/s)",
+                answered, elapsed, answered / elapsed if elapsed else 0.0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import asyncio
+import os
+
+MAX_BATCH_SIZE = int(os.getenv("CHAT_MAX_BATCH_SIZE", "16"))
+MAX_WAIT_MS = float(os.getenv("CHAT_MAX_WAIT_MS", "5"))
+
+
+class MicroBatcher:
+    """Groups concurrent requests into batches for a blocking batch function.
+
+    submit() queues an item and waits for its result. A single worker task
+    takes the first queued item, keeps collecting for up to ``max_wait_ms``
+    or until ``max_batch_size`` items are waiting, runs
+    ``process_batch(items)`` in a worker thread and hands each result back to
+    its caller; a result that is an exception is raised to that caller
+    alone. While one batch runs the next one fills up.
+    """
+
+    def __init__(self, process_batch, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = None
+        self._task = None
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Batcher stopped before the request was processed."))
+
+    async def submit(self, item):
+        if self._task is None:
+            raise RuntimeError("MicroBatcher.start() has not been called.")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Callers that gave up while waiting don't need an answer
+        return [(item, future) for item, future in batch if not future.done()]
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+            try:
+                results = await asyncio.to_thread(self.process_batch, [item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
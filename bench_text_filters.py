@@ -0,0 +1,102 @@
+import argparse
+import re
+import time
+from nltk.tokenize import sent_tokenize
+from pdf_pipeline import iter_pdf_pages, list_pdfs
+from text_cleaning import clean_sentence, clean_text, is_answer_sentence, remove_boilerplate
+
+# The per-call implementations the compiled patterns replaced, kept for comparison
+
+def legacy_remove_boilerplate(text):
+    cleaned = []
+    for line in text.split("\n"):
+        line = line.strip()
+        if any(x in line.lower() for x in ["www.ziziafrique", "info@ziziafrique", "follow us", "annual report", "contents"]):
+            continue
+        if re.fullmatch(r"[0-9\s\W]+", line):
+            continue
+        cleaned.append(line)
+    return "\n".join(cleaned)
+
+def legacy_is_answer_sentence(sentence):
+    lowered = sentence.lower()
+    if "www." in lowered or "http" in lowered:
+        return False
+    if "@" in sentence or "Follow us" in sentence or "Annual Report" in sentence or "Contents" in sentence:
+        return False
+    if len(re.sub(r'[^a-zA-Z]', '', sentence)) < 20:
+        return False
+    return len(sentence.split()) >= 4
+
+def legacy_clean_text(text):
+    text = re.sub(r'\n{2,}', '\n', text)
+    text = re.sub(r'(?<!\n)\n(?!\n)', ' ', text)
+    text = re.sub(r' +', ' ', text)
+    return '\n'.join(line.strip() for line in text.split('\n'))
+
+def legacy_clean_sentence(sentence):
+    return re.sub(r"^[\s\-–•]*([a-zA-Z0-9]{1,2})[\.\)]\s+", "", sentence).strip()
+
+def best_of(repeat, fn, *args):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+def report(name, count, unit, legacy_seconds, new_seconds):
+    print(f"{name:<22} {count / legacy_seconds:>12,.0f} {count / new_seconds:>12,.0f} {unit}/s "
+          f"  ×{legacy_seconds / new_seconds:.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Old vs. compiled text filtering throughput on the PDF corpus.")
+    parser.add_argument("--docs", default="docs", help="Folder with the PDFs")
+    parser.add_argument("--repeat", type=int, default=3, help="Best of this many runs")
+    parser.add_argument("--chunks-per-query", type=int, default=5)
+    args = parser.parse_args()
+
+    pages = [page.page_content for page in iter_pdf_pages(list_pdfs(args.docs), clean=False)]
+    lines = sum(page.count("\n") + 1 for page in pages)
+    sentences = [s.strip() for page in pages for s in sent_tokenize(page)]
+    print(f"📚 {len(pages)} pages, {lines} lines, {len(sentences)} sentences\n")
+    print(f"{'':<22} {'legacy':>12} {'compiled':>12}")
+
+    legacy, legacy_pages = best_of(args.repeat, lambda: [legacy_remove_boilerplate(p) for p in pages])
+    new, new_pages = best_of(args.repeat, lambda: [remove_boilerplate(p) for p in pages])
+    assert legacy_pages == new_pages
+    report("remove_boilerplate", lines, "lines", legacy, new)
+
+    legacy, legacy_verdicts = best_of(args.repeat, lambda: [legacy_is_answer_sentence(s) for s in sentences])
+    new, new_verdicts = best_of(args.repeat, lambda: [is_answer_sentence(s) for s in sentences])
+    assert legacy_verdicts == new_verdicts
+    report("is_answer_sentence", len(sentences), "sentences", legacy, new)
+
+    # Query path: before, every answer tokenized, filtered and cleaned the
+    # sentences of its retrieved chunks; now those sentences are stored
+    # cleaned and the answer only slices and joins them.
+    n = args.chunks_per_query
+    queries = [pages[i:i + n] for i in range(0, len(pages), n)]
+
+    def legacy_answers():
+        answers = []
+        for chunks in queries:
+            picked = [legacy_clean_sentence(s) for c in chunks for s in sent_tokenize(c)
+                      if legacy_is_answer_sentence(s.strip())]
+            answers.append(legacy_clean_text(" ".join(picked[:3]).strip()))
+        return answers
+
+    stored = [[clean_text(clean_sentence(s.strip())) for s in sent_tokenize(page) if is_answer_sentence(s.strip())]
+              for page in pages]
+    stored_queries = [stored[i:i + n] for i in range(0, len(stored), n)]
+
+    def new_answers():
+        return [" ".join([s for chunk in chunks for s in chunk][:3]) for chunks in stored_queries]
+
+    legacy, legacy_result = best_of(args.repeat, legacy_answers)
+    new, new_result = best_of(args.repeat, new_answers)
+    assert legacy_result == new_result
+    report("answer assembly", len(queries), "queries", legacy, new)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime
+import numpy as np
+
+DEFAULT_CORPUS = ["benchmark_queries.jsonl", "logs.txt"]
+# Environment variables that change what is being measured; recorded with each result
+CONFIG_PREFIXES = ("RAG_", "FAISS_", "CHAT_", "EMBED_")
+SAMPLE_RE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})? (\S+)$", re.MULTILINE)
+WORKER_RE = re.compile(r',?worker="([^"]*)"')
+STAGE_RE = re.compile(r'^rag_stage_seconds_(sum|count)\{stage="([^"]+)"\}$')
+
+
+def load_corpus(paths):
+    """Queries to replay, in file order.
+
+    ``.jsonl`` files hold one object per line with a ``query`` (or
+    ``question``) field; any other file is read as a chat log and its
+    ``Q:`` lines are used. Repeats are kept, since they are real traffic.
+    """
+    queries = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        queries.append(record.get("query") or record.get("question") or "")
+            else:
+                queries.extend(line[2:] for line in f if line.startswith("Q:"))
+    return [q.strip() for q in queries if q.strip()]
+
+def parse_metrics(text):
+    """``{sample name with labels: value}`` from a Prometheus text exposition.
+
+    The ``worker`` label is left out of the names and collected under the
+    ``None`` key, as the set of workers the samples came from.
+    """
+    samples = {}
+    workers = set()
+    for name, labels, value in SAMPLE_RE.findall(text):
+        workers.update(WORKER_RE.findall(labels))
+        labels = WORKER_RE.sub("", labels).replace("{,", "{")
+        samples[name + ("" if labels == "{}" else labels)] = float(value)
+    samples[None] = workers
+    return samples
+
+def metrics_delta(before, after):
+    """Per-stage time and call counts, and counters, accumulated during the run.
+
+    ``metrics_workers`` lists the workers the snapshots came from. A server
+    started by serve.py reports totals over all workers, without any; more
+    than one means each snapshot only covers the worker that answered it,
+    and the difference is not meaningful (see print_report).
+    """
+    before, after = dict(before), dict(after)
+    workers = before.pop(None, set()) | after.pop(None, set())
+    delta = {key: value - before.get(key, 0.0) for key, value in after.items()}
+    stages = {}
+    for key, value in delta.items():
+        match = STAGE_RE.match(key)
+        if match:
+            stages.setdefault(match.group(2), {})[match.group(1)] = value
+    return {
+        "stages": {
+            name: {
+                "calls": int(s.get("count", 0)),
+                "total_s": s.get("sum", 0.0),
+                "mean_ms": s.get("sum", 0.0) / s["count"] * 1000,
+            }
+            for name, s in sorted(stages.items()) if s.get("count")
+        },
+        "counters": {
+            key: int(value) for key, value in sorted(delta.items())
+            if "_total" in key and value
+        },
+        "metrics_workers": sorted(workers),
+    }
+
+
+class InProcessTarget:
+    """Answers through the engine and the same micro-batcher main.py uses."""
+
+    name = "in-process"
+
+    def __init__(self, use_cache=True):
+        self.use_cache = use_cache
+        self.batcher = None
+
+    async def start(self):
+        from batching import MicroBatcher
+        from cache import ResponseCache
+        from rag import engine
+
+        if not self.use_cache:
+            engine.cache = ResponseCache(max_size=0)
+        await asyncio.to_thread(engine.warm_up)
+        self.batcher = MicroBatcher(engine.get_responses)
+        await self.batcher.start()
+
+    async def ask(self, query):
+        return await self.batcher.submit(query)
+
+    async def metrics(self):
+        from metrics import REGISTRY
+        return REGISTRY.render()
+
+    async def stop(self):
+        await self.batcher.stop()
+
+
+class HTTPTarget:
+    """Posts to a running server's /chat endpoint.
+
+    Start the server with RAG_CACHE_MAX_SIZE=0 to measure uncached answers.
+    """
+
+    name = "http"
+
+    def __init__(self, url, concurrency, timeout=60.0, ready_timeout=600.0):
+        self.url = url.rstrip("/")
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.ready_timeout = ready_timeout
+        self.client = None
+
+    async def start(self):
+        import httpx
+
+        self.client = httpx.AsyncClient(
+            base_url=self.url,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.concurrency),
+        )
+        deadline = time.monotonic() + self.ready_timeout
+        while True:
+            try:
+                if (await self.client.get("/ready")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"❗ {self.url} did not become ready within {self.ready_timeout:.0f}s.")
+            await asyncio.sleep(1)
+
+    async def ask(self, query):
+        response = await self.client.post("/chat", json={"query": query})
+        response.raise_for_status()
+        return response.json()["response"]
+
+    async def metrics(self):
+        response = await self.client.get("/metrics")
+        return response.text if response.status_code == 200 else ""
+
+    async def stop(self):
+        await self.client.aclose()
+
+
+async def replay(target, queries, concurrency):
+    """Send ``queries`` with ``concurrency`` requests in flight (closed loop).
+
+    Returns per-request latencies in seconds, the error count and wall time.
+    """
+    pending = iter(queries)
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for query in pending:
+            started = time.perf_counter()
+            try:
+                await target.ask(query)
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def run_benchmark(target, corpus, requests, concurrency, warmup):
+    await target.start()
+    try:
+        if warmup:
+            await replay(target, [corpus[i % len(corpus)] for i in range(warmup)], concurrency)
+        before = parse_metrics(await target.metrics())
+        measured = [corpus[i % len(corpus)] for i in range(requests)]
+        latencies, errors, wall = await replay(target, measured, concurrency)
+        after = parse_metrics(await target.metrics())
+    finally:
+        await target.stop()
+
+    ms = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (float("nan"),) * 3
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "target": target.name,
+        "concurrency": concurrency,
+        "requests": requests,
+        "warmup": warmup,
+        "corpus_size": len(set(corpus)),
+        "config": {k: v for k, v in sorted(os.environ.items()) if k.startswith(CONFIG_PREFIXES)},
+        "errors": errors,
+        "wall_s": wall,
+        "throughput_rps": len(latencies) / wall if wall else 0.0,
+        "latency_ms": {
+            "mean": float(ms.mean()) if len(ms) else float("nan"),
+            "p50": float(p50),
+            "p95": float(p95),
+            "p99": float(p99),
+            "max": float(ms.max()) if len(ms) else float("nan"),
+        },
+        **metrics_delta(before, after),
+    }
+
+def print_report(result):
+    latency = result["latency_ms"]
+    print(f"🎯 {result['target']} @ {result['concurrency']} concurrent, {result['requests']} requests "
+          f"({result['corpus_size']} distinct queries), commit {result['commit']}")
+    print(f"⏱️ p50 {latency['p50']:.1f} ms | p95 {latency['p95']:.1f} ms | p99 {latency['p99']:.1f} ms "
+          f"| max {latency['max']:.1f} ms")
+    print(f"🚀 {result['throughput_rps']:.1f} req/s, {result['errors']} errors")
+    if result["stages"]:
+        print(f"{'stage':<12} {'calls':>7} {'mean ms':>9} {'total s':>9}")
+        for name, s in result["stages"].items():
+            print(f"{name:<12} {s['calls']:>7} {s['mean_ms']:>9.2f} {s['total_s']:>9.2f}")
+    for key, value in result["counters"].items():
+        print(f"   {key}: {value}")
+    if len(result.get("metrics_workers", ())) > 1:
+        print(f"⚠️ Stage times and counters mix the metrics of workers {', '.join(result['metrics_workers'])}: "
+              "serve with serve.py (RAG_METRICS_DIR) or a single worker to trust them.")
+
+def compare(result, baseline, max_regression_pct):
+    """Print the change against ``baseline``; return the metrics that regressed too far."""
+    rows = [(f"latency {p}", result["latency_ms"][p], baseline["latency_ms"][p], False) for p in ("p50", "p95", "p99")]
+    rows.append(("throughput", result["throughput_rps"], baseline["throughput_rps"], True))
+    print(f"\n📊 Against {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    regressions = []
+    for name, current, previous, higher_is_better in rows:
+        change = (current - previous) / previous * 100 if previous else 0.0
+        worse = -change if higher_is_better else change
+        flag = "❌" if worse > max_regression_pct else "  "
+        print(f"{flag} {name:<12} {previous:>9.2f} → {current:>9.2f} ({change:+.1f}%)")
+        if worse > max_regression_pct:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a query corpus against the RAG engine and report latency.")
+    parser.add_argument("--target", choices=("in-process", "http"), default="in-process")
+    parser.add_argument("--url", default="http://localhost:8000", help="Server for --target http")
+    parser.add_argument("--corpus", nargs="+", default=DEFAULT_CORPUS, help=".jsonl query files or Q: logs")
+    parser.add_argument("--requests", type=int, help="Measured requests (default: one pass over the corpus)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests sent first")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the response cache (in-process only)")
+    parser.add_argument("--output", help="Write the result as JSON to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="Result file of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=10.0,
+                        help="Exit non-zero when a metric is this many percent worse than the baseline")
+    args = parser.parse_args()
+
+    corpus = load_corpus([path for path in args.corpus if os.path.exists(path)])
+    if not corpus:
+        sys.exit(f"❗ No queries found in {args.corpus}.")
+    if args.target == "http":
+        target = HTTPTarget(args.url, args.concurrency)
+    else:
+        target = InProcessTarget(use_cache=not args.no_cache)
+
+    result = asyncio.run(run_benchmark(target, corpus, args.requests or len(corpus), args.concurrency, args.warmup))
+    print_report(result)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(result, baseline, args.max_regression):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+import numpy as np
+from atomic_files import replacing
+
+BM25_DIR = "bm25"
+FORMAT_VERSION = 1
+K1 = 1.5
+B = 0.75
+MAX_TOKEN_LENGTH = 32
+
+# Keeps numbers such as "2,313" or "4.5" and acronyms such as "4ir" whole
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+
+def tokenize(text: str) -> list[str]:
+    return [t[:MAX_TOKEN_LENGTH] for t in TOKEN_RE.findall(text.lower())]
+
+
+class BM25Index:
+    """Compact BM25 inverted index stored as memory-mapped numpy arrays.
+
+    Postings are laid out CSR-style: the postings of term ``t`` are
+    ``docs[offsets[t]:offsets[t + 1]]`` with their precomputed BM25 weights
+    in ``weights``, so a query is a handful of slice-and-add operations and
+    loading is just mapping the files. Terms are a sorted fixed-width string
+    array looked up with searchsorted.
+    """
+
+    ARRAYS = ("terms", "offsets", "docs", "weights", "doc_ids")
+
+    def __init__(self, terms, offsets, docs, weights, doc_ids):
+        self.terms = terms
+        self.offsets = offsets
+        self.docs = docs
+        self.weights = weights
+        self.doc_ids = doc_ids
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    @classmethod
+    def build(cls, chunks, k1=K1, b=B):
+        """Build the index from ``(chunk_id, text)`` pairs."""
+        doc_ids = []
+        term_freqs = []
+        for chunk_id, text in chunks:
+            doc_ids.append(chunk_id)
+            term_freqs.append(Counter(tokenize(text)))
+
+        doc_lengths = np.array([sum(tf.values()) for tf in term_freqs], dtype=np.float32)
+        avgdl = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        postings = {}
+        for doc, tf in enumerate(term_freqs):
+            for term, freq in tf.items():
+                postings.setdefault(term, []).append((doc, freq))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        docs = []
+        weights = []
+        n_docs = len(doc_ids)
+        for i, term in enumerate(terms):
+            term_postings = postings[term]
+            idf = math.log(1 + (n_docs - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+            for doc, freq in term_postings:
+                norm = k1 * (1 - b + b * doc_lengths[doc] / avgdl) if avgdl else k1
+                docs.append(doc)
+                weights.append(idf * freq * (k1 + 1) / (freq + norm))
+            offsets[i + 1] = len(docs)
+
+        return cls(
+            np.array(terms, dtype=f"<U{MAX_TOKEN_LENGTH}"),
+            offsets,
+            np.array(docs, dtype=np.int32),
+            np.array(weights, dtype=np.float32),
+            np.array(doc_ids, dtype=str),
+        )
+
+    def save(self, path):
+        path = os.path.join(path, BM25_DIR)
+        os.makedirs(path, exist_ok=True)
+        targets = [os.path.join(path, f"{name}.npy") for name in self.ARRAYS] + [os.path.join(path, "meta.json")]
+        with replacing(*targets) as tmp_paths:
+            for name, tmp_path in zip(self.ARRAYS, tmp_paths):
+                with open(tmp_path, "wb") as f:
+                    np.save(f, getattr(self, name))
+            with open(tmp_paths[-1], "w", encoding="utf-8") as f:
+                json.dump({"format_version": FORMAT_VERSION, "num_docs": len(self)}, f)
+
+    @classmethod
+    def load(cls, path):
+        """Memory-map a saved index.
+
+        Returns None if missing, in an older format, or if its arrays do not
+        belong together (caught between the files of two saves).
+        """
+        path = os.path.join(path, BM25_DIR)
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format_version") != FORMAT_VERSION:
+            return None
+        index = cls(*(np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in cls.ARRAYS))
+        consistent = (
+            len(index) == meta.get("num_docs")
+            and len(index.offsets) == len(index.terms) + 1
+            and index.offsets[-1] == len(index.docs) == len(index.weights)
+        )
+        return index if consistent else None
+
+    def search(self, query: str, k=10, doc_mask=None) -> list[str]:
+        """Return the chunk ids of the ``k`` best BM25 matches for ``query``.
+
+        ``doc_mask`` is an optional boolean array over the indexed chunks;
+        chunks outside it are never returned.
+        """
+        tokens = np.array(sorted(set(tokenize(query))), dtype=f"<U{MAX_TOKEN_LENGTH}")
+        if not len(tokens) or not len(self.terms):
+            return []
+        positions = np.searchsorted(self.terms, tokens)
+        in_range = positions < len(self.terms)
+        positions, tokens = positions[in_range], tokens[in_range]
+        positions = positions[self.terms[positions] == tokens]
+        if not len(positions):
+            return []
+
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        for term in positions:
+            start, end = self.offsets[term], self.offsets[term + 1]
+            scores[self.docs[start:end]] += self.weights[start:end]
+        if doc_mask is not None:
+            scores[~doc_mask] = 0
+
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [str(self.doc_ids[i]) for i in top]
+
+def reciprocal_rank_fusion(rankings, k=5, c=60):
+    """Fuse ranked id lists: each id scores ``sum(1 / (c + rank))`` over the lists."""
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1 / (c + rank)
+    return sorted(scores, key=scores.get, reverse=True)[:k]
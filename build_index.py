@@ -1,51 +1,44 @@
-<<<<<<< HEAD
-from langchain.vectorstores import FAISS
-from langchain.embeddings import OllamaEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.document_loaders import PyPDFLoader
+from ann_index import INDEX_TYPE
+from embedding_backends import get_embedding_provider
+from dedup import unique_chunks
+from embedding_cache import with_embedding_cache
+from index_builder import (add_chunks_streaming, checkpoint_path_for, clear_checkpoint, load_checkpoint,
+                           merge_duplicate_sources, with_page_chunk_ids)
+from index_store import new_store_version, save_faiss_store
+from pdf_pipeline import iter_chunks, iter_pdf_pages, list_pdfs
+from rag import build_derived_indexes
+import logging
 import os
 
 DATA_FOLDER = "data"
-PDF_FILES = [f for f in os.listdir(DATA_FOLDER) if f.endswith(".pdf")]
-
-docs = []
-for pdf_file in PDF_FILES:
-    loader = PyPDFLoader(os.path.join(DATA_FOLDER, pdf_file))
-    docs.extend(loader.load())
-
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
-chunks = text_splitter.split_documents(docs)
-
-print(f"✅ Loaded {len(PDF_FILES)} PDFs and split into {len(chunks)} chunks")
-
-embeddings = OllamaEmbeddings(model="llama3")
-db = FAISS.from_documents(chunks, embeddings)
-
-db.save_local(os.path.join(DATA_FOLDER, "faiss_index"))
-print("✅ FAISS index created and saved.")
-=======
-from langchain.vectorstores import FAISS
-from langchain.embeddings import OllamaEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.document_loaders import PyPDFLoader
-import os
-
-DATA_FOLDER = "data"
-PDF_FILES = [f for f in os.listdir(DATA_FOLDER) if f.endswith(".pdf")]
-
-docs = []
-for pdf_file in PDF_FILES:
-    loader = PyPDFLoader(os.path.join(DATA_FOLDER, pdf_file))
-    docs.extend(loader.load())
-
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
-chunks = text_splitter.split_documents(docs)
-
-print(f"✅ Loaded {len(PDF_FILES)} PDFs and split into {len(chunks)} chunks")
-
-embeddings = OllamaEmbeddings(model="llama3")
-db = FAISS.from_documents(chunks, embeddings)
-
-db.save_local(os.path.join(DATA_FOLDER, "faiss_index"))
-print("✅ FAISS index created and saved.")
->>>>>>> 21f128ad591456f412735795fb48f8b4568ea0bb
+INDEX_PATH = os.path.join(DATA_FOLDER, "faiss_index")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    PDF_FILES = list_pdfs(DATA_FOLDER)
+
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
+    chunks = iter_chunks(iter_pdf_pages(PDF_FILES, clean=False), text_splitter)
+
+    # EMBEDDING_BACKEND / EMBEDDING_MODEL pick the model (EMBEDDING_BACKEND=ollama for a server)
+    embeddings = with_embedding_cache(get_embedding_provider())
+    checkpoint_path = checkpoint_path_for(INDEX_PATH)
+    db, done_ids = load_checkpoint(checkpoint_path, embeddings)
+    # Repeated chunks (report boilerplate) are embedded once, citing every copy
+    duplicates = {}
+    db = add_chunks_streaming(
+        db, unique_chunks(with_page_chunk_ids(chunks), duplicates=duplicates), embeddings, checkpoint_path, done_ids
+    )
+    if db is None:
+        raise SystemExit(f"❗ No chunks to index in {DATA_FOLDER}/.")
+    merge_duplicate_sources(db.docstore, duplicates)
+
+    print(f"✅ Loaded {len(PDF_FILES)} PDFs and split into {db.index.ntotal} chunks")
+
+    # Derived indexes first, tagged with the version the store is saved under
+    version = new_store_version()
+    build_derived_indexes(db, embeddings, INDEX_PATH, embeddings.model_name, INDEX_TYPE, version)
+    save_faiss_store(db, INDEX_PATH, embeddings.model_name, version=version)
+    clear_checkpoint(checkpoint_path)
+    print("✅ FAISS index created and saved.")
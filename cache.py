@@ -0,0 +1,154 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+CACHE_MAX_SIZE = int(os.getenv("RAG_CACHE_MAX_SIZE", "1024"))
+CACHE_TTL_SECONDS = float(os.getenv("RAG_CACHE_TTL_SECONDS", "3600"))
+# Cosine similarity above which a new query reuses a cached answer.
+# Leave empty to disable the semantic tier.
+CACHE_SEMANTIC_THRESHOLD = os.getenv("RAG_CACHE_SEMANTIC_THRESHOLD", "0.95")
+
+def normalize_query(query: str) -> str:
+    query = re.sub(r"\s+", " ", query.lower()).strip()
+    return query.rstrip("?!. ")
+
+
+class ResponseCache:
+    """LRU + TTL cache of get_response results.
+
+    Exact hits are keyed on the normalized query text. With a semantic
+    threshold set, a miss can still be served by a cached query whose
+    embedding is at least that close; embeddings live in a preallocated
+    matrix so the lookup is one matrix-vector product. Entries carry a scope
+    (the year the query asks about) and only match queries with the same
+    scope, so "goals for 2022" never answers "goals for 2023".
+
+    The cache is bound to an index version and empties itself when the
+    version changes.
+    """
+
+    def __init__(self, max_size=CACHE_MAX_SIZE, ttl_seconds=CACHE_TTL_SECONDS,
+                 semantic_threshold=CACHE_SEMANTIC_THRESHOLD):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.semantic_threshold = float(semantic_threshold) if semantic_threshold not in (None, "") else None
+        self.version = None
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._matrix = None
+        self._free_slots = list(range(max_size))
+        self._slot_keys = [None] * max_size
+
+    def set_version(self, version):
+        """Bind the cache to an index version, dropping entries from older ones."""
+        with self._lock:
+            if version != self.version:
+                self._clear()
+                self.version = version
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._entries.clear()
+        self._free_slots = list(range(self.max_size))
+        self._slot_keys = [None] * self.max_size
+
+    def get(self, query):
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry["expires_at"] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry["response"])
+
+    def get_similar(self, embedding, scope=None):
+        """Return the answer of the closest cached query, if close enough."""
+        if self.semantic_threshold is None:
+            return None
+        with self._lock:
+            slots = [
+                e["slot"] for e in self._entries.values()
+                if e["slot"] is not None and e["scope"] == scope
+            ]
+            if not slots:
+                return None
+            scores = self._matrix[slots] @ np.asarray(embedding, dtype=np.float32)
+            best = int(np.argmax(scores))
+            if scores[best] < self.semantic_threshold:
+                return None
+            key = self._slot_keys[slots[best]]
+            entry = self._entries[key]
+            if entry["expires_at"] < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            self.semantic_hits += 1
+            return dict(entry["response"])
+
+    def record_miss(self, count=1):
+        with self._lock:
+            self.misses += count
+
+    def put(self, query, response, embedding=None, scope=None, version=None):
+        """Cache ``response``; ``version`` is the index version it was computed on.
+
+        An answer from another version than the current one (a reload
+        finished while it was computed) is not cached.
+        """
+        if self.max_size <= 0:
+            # RAG_CACHE_MAX_SIZE=0 disables caching
+            return
+        key = normalize_query(query)
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            if key in self._entries:
+                self._remove(key)
+            while len(self._entries) >= self.max_size:
+                self._remove(next(iter(self._entries)))
+
+            slot = None
+            if embedding is not None and self.semantic_threshold is not None:
+                embedding = np.asarray(embedding, dtype=np.float32)
+                if self._matrix is None:
+                    self._matrix = np.zeros((self.max_size, embedding.shape[-1]), dtype=np.float32)
+                slot = self._free_slots.pop()
+                self._matrix[slot] = embedding
+                self._slot_keys[slot] = key
+
+            self._entries[key] = {
+                "response": dict(response),
+                "scope": scope,
+                "slot": slot,
+                "expires_at": time.monotonic() + self.ttl_seconds,
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        if entry["slot"] is not None:
+            self._free_slots.append(entry["slot"])
+            self._slot_keys[entry["slot"]] = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.semantic_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+            }
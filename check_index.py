@@ -1,10 +1,12 @@
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
+from index_store import load_faiss_store, read_header
 
-embedding = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+INDEX_PATH = "faiss_index"
 
-db = FAISS.load_local("faiss_index", embedding, allow_dangerous_deserialization=True)
+# Only the vector count is needed, so no embedding model is loaded
+db = load_faiss_store(INDEX_PATH, embedding=None)
+header = read_header(INDEX_PATH)
 
 print("✅ FAISS index loaded.")
+print(f"🧾 Format: {header['format']} v{header['format_version']} (model: {header['model']}, dim: {header['dim']})")
 print("📊 Number of vectors:", db.index.ntotal)
-
+print("📚 Number of chunks:", len(db.docstore))
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import re
+import numpy as np
+
+# Largest Hamming distance between 64-bit SimHashes that still counts as a
+# near-duplicate. Leave empty to only collapse exact duplicates.
+DEDUP_MAX_DISTANCE = os.getenv("DEDUP_MAX_DISTANCE", "3")
+SHINGLE_SIZE = 3
+
+WORD_RE = re.compile(r"\w+")
+NUMBER_RE = re.compile(r"\d+")
+BITS = np.arange(64, dtype=np.uint64)
+
+def content_key(text: str) -> bytes:
+    """Exact-duplicate key: case and whitespace don't matter."""
+    return hashlib.sha1(" ".join(WORD_RE.findall(text.lower())).encode("utf-8")).digest()
+
+def simhash(text: str, shingle_size: int = SHINGLE_SIZE) -> int:
+    """64-bit SimHash of the word shingles of ``text``.
+
+    Texts sharing most of their shingles get hashes a few bits apart.
+    """
+    words = WORD_RE.findall(text.lower())
+    shingles = [" ".join(words[i:i + shingle_size]) for i in range(max(1, len(words) - shingle_size + 1))]
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in shingles],
+        dtype=np.uint64,
+    )
+    bits = (hashes[:, None] >> BITS) & np.uint64(1)
+    votes = 2 * bits.sum(axis=0, dtype=np.int64) - len(hashes)
+    return int(sum(1 << int(bit) for bit in np.flatnonzero(votes > 0)))
+
+
+class Deduplicator:
+    """Spots texts that repeat one already seen, exactly or nearly.
+
+    Exact duplicates are found by content_key(). Near-duplicates are texts
+    whose SimHashes differ in at most ``max_distance`` bits; the hash is cut
+    into ``max_distance + 1`` bands, so any such pair agrees on at least one
+    band and only texts sharing a band are compared. Texts that mention
+    different numbers are never near-duplicates: "300 learners in 2022" and
+    "400 learners in 2023" are different facts.
+    """
+
+    def __init__(self, max_distance=DEDUP_MAX_DISTANCE):
+        self.max_distance = int(max_distance) if max_distance not in (None, "") else None
+        self._exact = {}
+        self._bands = {}
+        self._hashes = {}
+        if self.max_distance is not None:
+            bands = self.max_distance + 1
+            width = 64 // bands
+            self._band_masks = [((1 << width) - 1) << (band * width) for band in range(bands)]
+
+    def __len__(self):
+        return len(self._exact)
+
+    def add(self, text, key):
+        """Remember ``text`` under ``key`` unless it duplicates a text seen before.
+
+        Returns the key of that earlier text, or None for a new one.
+        """
+        exact = content_key(text)
+        if exact in self._exact:
+            return self._exact[exact]
+        self._exact[exact] = key
+        if self.max_distance is None:
+            return None
+
+        fingerprint = simhash(text)
+        numbers = tuple(NUMBER_RE.findall(text))
+        bands = [(band, fingerprint & mask) for band, mask in enumerate(self._band_masks)]
+        for band in bands:
+            for other in self._bands.get(band, ()):
+                other_fingerprint, other_numbers = self._hashes[other]
+                if other_numbers == numbers and (fingerprint ^ other_fingerprint).bit_count() <= self.max_distance:
+                    # Later exact copies of this text resolve to the same key
+                    self._exact[exact] = other
+                    return other
+        self._hashes[key] = (fingerprint, numbers)
+        for band in bands:
+            self._bands.setdefault(band, []).append(key)
+        return None
+
+def source_reference(metadata):
+    """Where one copy of a chunk comes from."""
+    return {"source": metadata.get("source", ""), "page": metadata.get("page", 0), "year": metadata.get("year")}
+
+def _with_sources(metadata, sources):
+    sources = sorted(sources, key=lambda r: (-(r["year"] or 0), r["source"], r["page"]))
+    return {**metadata, "sources": sources, "years": sorted({r["year"] for r in sources if r["year"] is not None})}
+
+def merge_references(metadata, references):
+    """``metadata`` of a kept chunk, extended with the copies collapsed into it.
+
+    ``sources`` lists every copy, newest report first, which is the one to
+    cite; ``years`` lists every report year, for year filters.
+    """
+    merged = {}
+    for reference in (metadata.get("sources") or [source_reference(metadata)]) + list(references):
+        merged.setdefault((reference["source"], reference["page"]), reference)
+    return _with_sources(metadata, merged.values())
+
+def drop_references(metadata, filenames):
+    """``metadata`` without the copies from ``filenames``, e.g. after those files are removed."""
+    if not metadata.get("sources"):
+        return metadata
+    return _with_sources(metadata, [
+        r for r in metadata["sources"] if os.path.basename(r["source"].replace("\\", "/")) not in filenames
+    ])
+
+def unique_chunks(pairs, deduplicator=None, duplicates=None):
+    """Yield the ``(chunk_id, chunk)`` pairs whose text is not a duplicate of an earlier one.
+
+    When ``duplicates`` is a dict, the source_reference() of every dropped
+    copy is appended to ``duplicates[kept chunk id]``, for merge_references().
+    """
+    if deduplicator is None:
+        deduplicator = Deduplicator()
+    for chunk_id, chunk in pairs:
+        kept_id = deduplicator.add(chunk.page_content, chunk_id)
+        if kept_id in (None, chunk_id):
+            yield chunk_id, chunk
+        elif duplicates is not None:
+            duplicates.setdefault(kept_id, []).append(source_reference(chunk.metadata))
@@ -0,0 +1,262 @@
+import abc
+import json
+import logging
+import os
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# sentence-transformers | onnx | onnx-int8 | ollama
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence-transformers")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# Intra-op threads for torch / ONNX Runtime; 0 keeps the library default
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", "0"))
+# Exported ONNX models are cached here, one folder per model
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "models")
+MODEL_MARKER_FILE = "embedding_model.json"
+
+def canonical_model_name(model_name):
+    """``sentence-transformers/all-MiniLM-L6-v2`` and ``all-MiniLM-L6-v2`` are the same model."""
+    if model_name is None:
+        return None
+    return model_name.removeprefix("sentence-transformers/")
+
+
+class EmbeddingProvider(Embeddings, abc.ABC):
+    """One embedding model behind every index and query path.
+
+    Exposes the SentenceTransformer-style ``encode`` used for query and
+    sentence embeddings as well as the LangChain Embeddings interface used
+    by the vector stores. Embeddings are normalized, so L2 distance and dot
+    product rank alike.
+    """
+
+    backend = None
+
+    def __init__(self, model_name, batch_size=EMBED_BATCH_SIZE):
+        self.model_name = canonical_model_name(model_name)
+        self.batch_size = batch_size
+
+    @abc.abstractmethod
+    def _encode_batch(self, texts: list[str]) -> np.ndarray:
+        """Unnormalized float vectors of one batch of ``texts``."""
+
+    @abc.abstractmethod
+    def get_sentence_embedding_dimension(self) -> int:
+        """Length of the vectors."""
+
+    def set_threads(self, threads: int):
+        """Change the intra-op thread count, e.g. in a freshly forked worker."""
+
+    def encode(self, texts, batch_size=None, normalize_embeddings=True, convert_to_numpy=True):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        batch_size = batch_size or self.batch_size
+        if texts:
+            vectors = np.concatenate([
+                self._encode_batch(texts[start:start + batch_size])
+                for start in range(0, len(texts), batch_size)
+            ]).astype(np.float32, copy=False)
+        else:
+            vectors = np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        if normalize_embeddings:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.maximum(norms, 1e-12)
+        return vectors[0] if single else vectors
+
+    def embed_documents(self, texts):
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text):
+        return self.encode(text).tolist()
+
+
+class SentenceTransformerProvider(EmbeddingProvider):
+    backend = "sentence-transformers"
+
+    def __init__(self, model_name, batch_size=EMBED_BATCH_SIZE, threads=EMBED_THREADS):
+        super().__init__(model_name, batch_size)
+        # Imported here so that the ONNX backend never loads torch
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def set_threads(self, threads):
+        import torch
+
+        torch.set_num_threads(threads)
+
+    def _encode_batch(self, texts):
+        return self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+
+    def get_sentence_embedding_dimension(self):
+        return self.model.get_sentence_embedding_dimension()
+
+
+def export_onnx(model_name, out_dir, quantize=False):
+    """Export a sentence-transformers model's transformer to ONNX, once.
+
+    Writes model.onnx (and model_int8.onnx, dynamically quantized, when
+    ``quantize``), tokenizer.json and the pooling settings. Needs torch only
+    for the export itself.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    if not os.path.exists(fp32_path):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        logger.info("📦 Exporting %s to ONNX...", model_name)
+        st = SentenceTransformer(model_name, device="cpu")
+        transformer = st[0].auto_model.eval()
+        st.tokenizer.save_pretrained(out_dir)
+        dummy = st.tokenizer(["export"], return_tensors="pt")
+        inputs = ["input_ids", "attention_mask", "token_type_ids"]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in inputs}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+        with torch.no_grad():
+            torch.onnx.export(
+                transformer,
+                tuple(dummy[name] for name in inputs),
+                fp32_path + ".tmp",
+                input_names=inputs,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+            )
+        os.replace(fp32_path + ".tmp", fp32_path)
+        with open(os.path.join(out_dir, "config.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "model": canonical_model_name(model_name),
+                "max_seq_length": st.max_seq_length,
+                "dimension": st.get_sentence_embedding_dimension(),
+            }, f)
+
+    if quantize and not os.path.exists(os.path.join(out_dir, "model_int8.onnx")):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        logger.info("📦 Quantizing %s to int8...", model_name)
+        quantize_dynamic(fp32_path, os.path.join(out_dir, "model_int8.onnx"), weight_type=QuantType.QInt8)
+
+
+class ONNXProvider(EmbeddingProvider):
+    """MiniLM-style model run by ONNX Runtime: transformer, mean pooling, normalize.
+
+    No torch at query time. With ``quantize`` the int8 dynamically quantized
+    model is used, which embeds close enough to the fp32 one to query an
+    index built with either.
+    """
+
+    backend = "onnx"
+
+    def __init__(self, model_name, quantize=False, batch_size=EMBED_BATCH_SIZE, threads=EMBED_THREADS,
+                 model_dir=ONNX_MODEL_DIR):
+        super().__init__(model_name, batch_size)
+        from tokenizers import Tokenizer
+
+        out_dir = os.path.join(model_dir, self.model_name.replace("/", "__"))
+        export_onnx(model_name, out_dir, quantize)
+        with open(os.path.join(out_dir, "config.json"), encoding="utf-8") as f:
+            config = json.load(f)
+        self.dimension = config["dimension"]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(out_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=config["max_seq_length"])
+        self.tokenizer.enable_padding()
+
+        self.model_path = os.path.join(out_dir, "model_int8.onnx" if quantize else "model.onnx")
+        self.session = self._create_session(threads)
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        if quantize:
+            self.backend = "onnx-int8"
+
+    def _create_session(self, threads):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        return ort.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+
+    def set_threads(self, threads):
+        # ONNX Runtime fixes its thread pool when the session is created
+        self.session = self._create_session(threads)
+
+    def _encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        feed = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {k: v for k, v in feed.items() if k in self.input_names})[0]
+        mask = feed["attention_mask"][..., None].astype(np.float32)
+        return (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+
+class OllamaProvider(EmbeddingProvider):
+    """Embeddings from an Ollama server over HTTP, for indexes built with one."""
+
+    backend = "ollama"
+
+    def __init__(self, model_name, batch_size=EMBED_BATCH_SIZE):
+        super().__init__(model_name, batch_size)
+        from langchain_ollama import OllamaEmbeddings
+
+        self.client = OllamaEmbeddings(model=model_name, num_ctx=512)
+        self.dimension = None
+
+    def _encode_batch(self, texts):
+        vectors = np.array(self.client.embed_documents(texts), dtype=np.float32)
+        self.dimension = vectors.shape[1]
+        return vectors
+
+    def get_sentence_embedding_dimension(self):
+        if self.dimension is None:
+            self._encode_batch(["dimension"])
+        return self.dimension
+
+
+def get_embedding_provider(model_name=EMBEDDING_MODEL, backend=EMBEDDING_BACKEND,
+                           batch_size=EMBED_BATCH_SIZE, threads=EMBED_THREADS):
+    if backend == "sentence-transformers":
+        return SentenceTransformerProvider(model_name, batch_size, threads)
+    if backend in ("onnx", "onnx-int8"):
+        return ONNXProvider(model_name, quantize=backend == "onnx-int8", batch_size=batch_size, threads=threads)
+    if backend == "ollama":
+        return OllamaProvider(model_name, batch_size)
+    raise ValueError(
+        f"❗ Unknown EMBEDDING_BACKEND '{backend}', expected sentence-transformers, onnx, onnx-int8 or ollama."
+    )
+
+def ensure_same_model(indexed_model, model_name, where):
+    """Refuse to query vectors of one model with embeddings of another.
+
+    ``indexed_model`` None means the index predates model tracking.
+    """
+    if indexed_model is not None and canonical_model_name(indexed_model) != canonical_model_name(model_name):
+        raise ValueError(
+            f"❗ {where} was built with embedding model '{indexed_model}' but '{model_name}' is configured. "
+            f"Rebuild the index or set EMBEDDING_MODEL={indexed_model}."
+        )
+
+def check_model_marker(folder, model_name):
+    """ensure_same_model for stores without a header: a marker file in ``folder``."""
+    path = os.path.join(folder, MODEL_MARKER_FILE)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            ensure_same_model(json.load(f)["model"], model_name, folder)
+        return
+    os.makedirs(folder, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"model": canonical_model_name(model_name)}, f)
@@ -0,0 +1,151 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from sqlite_connection import ProcessLocalConnection
+
+logger = logging.getLogger(__name__)
+
+# Shared by every index build in this checkout; empty disables the cache
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE", "embedding_cache.sqlite")
+# Least recently used vectors beyond this many are evicted (~1.5 KB each for MiniLM)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+def cache_key(model_name, text):
+    """Content address of ``text`` embedded by ``model_name``.
+
+    Whitespace is collapsed first: the tokenizer splits on it anyway, so
+    re-wrapped text from another splitter setting embeds the same.
+    """
+    normalized = WHITESPACE_RE.sub(" ", text).strip()
+    return hashlib.sha256(f"{model_name}\0{normalized}".encode("utf-8")).digest()
+
+
+class EmbeddingCache(ProcessLocalConnection):
+    """On-disk map from cache_key() to float32 vector, bounded by LRU eviction.
+
+    Like the other SQLite stores it connects lazily, once per process.
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS vectors (
+                key BLOB PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS vectors_last_used ON vectors (last_used);
+            """
+        )
+        return conn
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+    def get_many(self, keys):
+        """``{key: vector}`` for the keys that are cached."""
+        found = {}
+        with self._lock:
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM vectors WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                found.update((key, np.frombuffer(vector, dtype=np.float32)) for key, vector in rows)
+            if found:
+                now = time.time()
+                self.conn.executemany("UPDATE vectors SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+                self.conn.commit()
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, items):
+        """Store ``(key, vector)`` pairs, evicting the least recently used beyond max_entries."""
+        now = time.time()
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO vectors (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items],
+            )
+            excess = self.conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self.conn.execute(
+                    "DELETE FROM vectors WHERE key IN (SELECT key FROM vectors ORDER BY last_used LIMIT ?)", (excess,)
+                )
+            self.conn.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info("🧠 Embedding cache: %d hits, %d misses (%.0f%% hit rate)",
+                    stats["hits"], stats["misses"], stats["hit_rate"] * 100)
+
+    def close(self):
+        with self._lock:
+            self._close_connection()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings that look document vectors up in an EmbeddingCache first.
+
+    Only cache misses reach the wrapped provider; queries are never cached.
+    Other attributes (encode, model_name, ...) are the provider's.
+    """
+
+    def __init__(self, provider, cache):
+        self.provider = provider
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self.provider, name)
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        keys = [cache_key(self.provider.model_name, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        if missing:
+            embedded = self.provider.embed_documents(list(missing.values()))
+            new = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(missing, embedded)}
+            self.cache.put_many(new.items())
+            vectors.update(new)
+        return [vectors[key].tolist() for key in keys]
+
+    def embed_query(self, text):
+        return self.provider.embed_query(text)
+
+def with_embedding_cache(provider, path=EMBEDDING_CACHE_PATH):
+    """Wrap ``provider`` in the shared on-disk cache, unless it is disabled."""
+    if not path:
+        return provider
+    return CachedEmbeddings(provider, EmbeddingCache(path))
@@ -0,0 +1,193 @@
+import argparse
+import difflib
+import json
+import os
+import time
+import numpy as np
+
+EVAL_SET = "eval_set.jsonl"
+# SequenceMatcher ratio above which a window of the answer counts as the keyword
+KEYWORD_THRESHOLD = 0.5
+
+def keyword_matches(answer: str, keywords: list[str], threshold: float = KEYWORD_THRESHOLD) -> np.ndarray:
+    """Which ``keywords`` occur in ``answer``, verbatim or approximately.
+
+    A keyword that is not a substring matches a window of
+    ``len(keyword words) + 2`` answer words whose SequenceMatcher ratio
+    reaches ``threshold``, the score the regression tests have always used.
+    Most windows are ruled out by real_quick_ratio() and quick_ratio(),
+    cheap upper bounds of ratio(), and each keyword is analysed once rather
+    than per window, so scoring is fast without changing any result.
+    """
+    answer = answer.lower()
+    words = answer.split()
+    found = np.zeros(len(keywords), dtype=bool)
+    for i, keyword in enumerate(keywords):
+        keyword = keyword.lower()
+        if keyword in answer:
+            found[i] = True
+            continue
+        size = len(keyword.split()) + 2
+        # SequenceMatcher caches what it learns about the second sequence
+        matcher = difflib.SequenceMatcher(None, "", keyword)
+        for start in range(len(words) - size + 1):
+            matcher.set_seq1(" ".join(words[start:start + size]))
+            if (matcher.real_quick_ratio() >= threshold and matcher.quick_ratio() >= threshold
+                    and matcher.ratio() >= threshold):
+                found[i] = True
+                break
+    return found
+
+def load_eval_set(path=EVAL_SET):
+    """Labelled queries: ``query``, ``expected_sources`` and ``expected_keywords``.
+
+    Each expected source is ``{"document": "<file>.pdf", "page": n}``; leave
+    out ``page`` to accept any page of the document. Queries without sources
+    only count towards keyword scores, and vice versa.
+    """
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def is_relevant(metadata, expected_sources):
+    # A collapsed duplicate matches the expected source through any of its copies
+    return any(
+        source["document"] == os.path.basename(copy.get("source", "").replace("\\", "/"))
+        and source.get("page", copy.get("page")) == copy.get("page")
+        for copy in metadata.get("sources") or [metadata]
+        for source in expected_sources
+    )
+
+def retrieval_scores(rankings, cases, ks):
+    """Mean recall@k for each k in ``ks`` and MRR over queries with expected sources."""
+    recalls = {k: [] for k in ks}
+    reciprocal_ranks = []
+    for hits, case in zip(rankings, cases):
+        expected = case.get("expected_sources") or []
+        if not expected:
+            continue
+        # Rank of the first hit matching each expected source
+        ranks = [
+            next((rank for rank, (_, doc) in enumerate(hits, start=1) if is_relevant(doc.metadata, [source])), None)
+            for source in expected
+        ]
+        for k in ks:
+            recalls[k].append(sum(rank is not None and rank <= k for rank in ranks) / len(expected))
+        first = min((rank for rank in ranks if rank is not None), default=None)
+        reciprocal_ranks.append(1 / first if first else 0.0)
+    return (
+        {k: float(np.mean(r)) if r else None for k, r in recalls.items()},
+        float(np.mean(reciprocal_ranks)) if reciprocal_ranks else None,
+    )
+
+def evaluate_engine(engine, cases, query_embeddings, ks):
+    """Score one warmed-up engine at each k: retrieval quality, answer keywords and latency."""
+    from rag import detect_expected_year
+
+    queries = [case["query"] for case in cases]
+    min_years = [int(year) if (year := detect_expected_year(q)) else None for q in queries]
+    rankings = engine.search_chunks(query_embeddings, k=max(ks), queries=queries, min_years=min_years)
+    recalls, mrr = retrieval_scores(rankings, cases, ks)
+
+    rows = []
+    for k in ks:
+        engine.top_k = k
+        latencies, keyword_scores = [], []
+        for case in cases:
+            started = time.perf_counter()
+            response = engine.get_response(case["query"])
+            latencies.append((time.perf_counter() - started) * 1000)
+            if case.get("expected_keywords"):
+                keyword_scores.append(keyword_matches(response["answer"], case["expected_keywords"]).mean())
+        rows.append({
+            "k": k,
+            "recall@k": recalls[k],
+            "mrr": mrr,
+            "keyword_rate": float(np.mean(keyword_scores)) if keyword_scores else None,
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+        })
+    return rows
+
+def index_path_for(chunk_size, chunk_overlap):
+    from rag import CHUNK_OVERLAP, CHUNK_SIZE, INDEX_FILE
+
+    if (chunk_size, chunk_overlap) == (CHUNK_SIZE, CHUNK_OVERLAP):
+        return INDEX_FILE
+    return f"{INDEX_FILE}_c{chunk_size}_o{chunk_overlap}"
+
+def sweep(cases, chunkings, index_types, ks):
+    """Evaluate every chunking × index type × k on ``cases``.
+
+    Each chunking gets its own index folder, built on first use; index types
+    are derived from it. One model is shared by all engines.
+    """
+    from cache import ResponseCache
+    from embedding_backends import get_embedding_provider
+    from rag import MODEL_NAME, RAGEngine
+
+    model = get_embedding_provider(MODEL_NAME)
+    query_embeddings = model.encode([case["query"] for case in cases], normalize_embeddings=True, convert_to_numpy=True)
+    results = []
+    for chunk_size, chunk_overlap in chunkings:
+        for index_type in index_types:
+            engine = RAGEngine(
+                index_path=index_path_for(chunk_size, chunk_overlap),
+                chunk_size=chunk_size, chunk_overlap=chunk_overlap, index_type=index_type, model=model,
+            )
+            engine.cache = ResponseCache(max_size=0)
+            engine.warm_up()
+            for row in evaluate_engine(engine, cases, query_embeddings, ks):
+                results.append({"chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "index_type": index_type, **row})
+    return results
+
+def recommend(results, tolerance):
+    """Fastest configuration within ``tolerance`` of the best recall and keyword rate."""
+    def best(field):
+        values = [r[field] for r in results if r[field] is not None]
+        return max(values) if values else None
+
+    best_recall, best_keywords = best("recall@k"), best("keyword_rate")
+    eligible = [
+        r for r in results
+        if (best_recall is None or (r["recall@k"] or 0.0) >= best_recall - tolerance)
+        and (best_keywords is None or (r["keyword_rate"] or 0.0) >= best_keywords - tolerance)
+    ]
+    return min(eligible, key=lambda r: r["p50_ms"]) if eligible else None
+
+def format_score(value):
+    return "    -" if value is None else f"{value:.3f}"
+
+def main():
+    from rag import CHUNK_OVERLAP, CHUNK_SIZE
+
+    parser = argparse.ArgumentParser(description="Retrieval and answer quality vs. latency across configurations.")
+    parser.add_argument("--eval-set", default=EVAL_SET)
+    parser.add_argument("--chunkings", default=f"{CHUNK_SIZE}:{CHUNK_OVERLAP}",
+                        help="Comma-separated chunk_size:overlap pairs")
+    parser.add_argument("--index-types", default="flat", help="Comma-separated FAISS index types")
+    parser.add_argument("--ks", default="3,5,10", help="Comma-separated values of k")
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="Quality loss accepted when picking the fastest configuration")
+    parser.add_argument("--output", help="Write all rows as JSON to this file")
+    args = parser.parse_args()
+
+    cases = load_eval_set(args.eval_set)
+    chunkings = [tuple(int(n) for n in pair.split(":")) for pair in args.chunkings.split(",")]
+    ks = sorted(int(k) for k in args.ks.split(","))
+    results = sweep(cases, chunkings, args.index_types.split(","), ks)
+
+    print(f"{'chunking':<10} {'index':<9} {'k':>3} {'recall@k':>9} {'MRR':>6} {'keywords':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for r in results:
+        print(f"{r['chunk_size']}:{r['chunk_overlap']:<6} {r['index_type']:<9} {r['k']:>3} "
+              f"{format_score(r['recall@k']):>9} {format_score(r['mrr']):>6} {format_score(r['keyword_rate']):>9} "
+              f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f}")
+    choice = recommend(results, args.tolerance)
+    if choice:
+        print(f"\n✅ Fastest without losing quality: chunk_size={choice['chunk_size']} "
+              f"overlap={choice['chunk_overlap']} index={choice['index_type']} k={choice['k']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import json
+import logging
+import os
+import numpy as np
+from cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+FAQ_PATH = os.getenv("FAQ_PATH", "faqs.json")
+# Cosine similarity above which a query gets the answer of the closest FAQ.
+# Leave empty to only answer exact (normalized) matches.
+FAQ_SEMANTIC_THRESHOLD = os.getenv("RAG_FAQ_THRESHOLD", "0.92")
+
+
+class FAQIndex:
+    """Canned answers to known questions, checked before retrieval.
+
+    ``faqs.json`` maps each question to its answer. Questions are normalized
+    like response cache keys into a dict, so a repeated question costs one
+    lookup, and embedded once at load time so a paraphrase costs one
+    matrix-vector product on the query embedding that is computed anyway.
+    """
+
+    def __init__(self, questions, answers, embeddings, semantic_threshold=FAQ_SEMANTIC_THRESHOLD):
+        self.questions = questions
+        self.answers = answers
+        self.embeddings = embeddings
+        self.semantic_threshold = float(semantic_threshold) if semantic_threshold not in (None, "") else None
+        self.exact = {normalize_query(q): i for i, q in enumerate(questions)}
+
+    def __len__(self):
+        return len(self.questions)
+
+    @classmethod
+    def load(cls, model, path=FAQ_PATH, semantic_threshold=FAQ_SEMANTIC_THRESHOLD):
+        """Load and embed ``path``; an empty index when the file is missing."""
+        faqs = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                faqs = json.load(f)
+        questions = list(faqs)
+        if questions:
+            embeddings = np.asarray(
+                model.encode(questions, normalize_embeddings=True, convert_to_numpy=True), dtype=np.float32
+            )
+        else:
+            embeddings = np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+        logger.info("💬 Loaded %d FAQs.", len(questions))
+        return cls(questions, [faqs[q] for q in questions], embeddings, semantic_threshold)
+
+    def _response(self, i):
+        return {"answer": self.answers[i], "source": None}
+
+    def get(self, query):
+        """The FAQ answer for ``query`` asked verbatim (up to case, spacing and punctuation)."""
+        i = self.exact.get(normalize_query(query))
+        return None if i is None else self._response(i)
+
+    def get_similar(self, embedding):
+        """The answer of the closest FAQ question, if close enough."""
+        if self.semantic_threshold is None or not len(self.questions):
+            return None
+        scores = self.embeddings @ np.asarray(embedding, dtype=np.float32)
+        best = int(np.argmax(scores))
+        if scores[best] < self.semantic_threshold:
+            return None
+        return self._response(best)
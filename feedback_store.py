@@ -0,0 +1,188 @@
+import argparse
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from sqlite_connection import ProcessLocalConnection
+
+logger = logging.getLogger(__name__)
+
+FEEDBACK_DB = os.getenv("FEEDBACK_DB", "feedback.sqlite")
+FEEDBACK_FLUSH_SIZE = int(os.getenv("FEEDBACK_FLUSH_SIZE", "100"))
+FEEDBACK_FLUSH_SECONDS = float(os.getenv("FEEDBACK_FLUSH_SECONDS", "2"))
+
+FIELDS = ("timestamp", "query", "answer", "source", "feedback")
+
+
+class FeedbackStore(ProcessLocalConnection):
+    """Append-only SQLite table of feedback events, indexed for aggregation.
+
+    The connection is opened per process, so forked server workers each get
+    their own and write to the same file.
+    """
+
+    def __init__(self, path=FEEDBACK_DB):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Workers share the file; wait for each other's writes instead of failing
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        # WAL lets summaries read while a batch is being written
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS feedback (
+                id INTEGER PRIMARY KEY,
+                timestamp TEXT NOT NULL,
+                query TEXT,
+                answer TEXT,
+                source TEXT,
+                feedback TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS feedback_timestamp ON feedback (timestamp);
+            CREATE INDEX IF NOT EXISTS feedback_feedback ON feedback (feedback);
+            CREATE INDEX IF NOT EXISTS feedback_source ON feedback (source, feedback);
+            """
+        )
+        return conn
+
+    def write_many(self, events):
+        with self._lock, self.conn:
+            self.conn.executemany(
+                f"INSERT INTO feedback ({', '.join(FIELDS)}) VALUES ({', '.join('?' * len(FIELDS))})",
+                [tuple(event.get(field) for field in FIELDS) for event in events],
+            )
+
+    def summary_by_source(self, since=None, until=None):
+        """Thumbs up / down counts per answer source, optionally within a time range."""
+        clauses, params = [], []
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self.conn.execute(
+                f"""
+                SELECT COALESCE(source, ''),
+                       SUM(feedback = 'thumbs_up'),
+                       SUM(feedback = 'thumbs_down'),
+                       COUNT(*)
+                FROM feedback {where}
+                GROUP BY COALESCE(source, '')
+                ORDER BY COUNT(*) DESC
+                """,
+                params,
+            ).fetchall()
+        return [
+            {"source": source, "thumbs_up": up, "thumbs_down": down, "total": total}
+            for source, up, down, total in rows
+        ]
+
+    def close(self):
+        with self._lock:
+            self._close_connection()
+
+
+class FeedbackWriter:
+    """Buffers feedback in memory and writes it to a FeedbackStore in batches.
+
+    submit() only appends to the buffer, so the request never waits on disk.
+    A background task flushes when ``flush_size`` events are buffered or
+    every ``flush_seconds``, writing in a worker thread. stop() drains
+    whatever is left.
+    """
+
+    def __init__(self, store, flush_size=FEEDBACK_FLUSH_SIZE, flush_seconds=FEEDBACK_FLUSH_SECONDS):
+        self.store = store
+        self.flush_size = flush_size
+        self.flush_seconds = flush_seconds
+        self._buffer = []
+        self._wake = None
+        self._task = None
+
+    async def start(self):
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def submit(self, event: dict):
+        event.setdefault("timestamp", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        self._buffer.append(event)
+        if len(self._buffer) >= self.flush_size and self._wake is not None:
+            self._wake.set()
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        write = asyncio.ensure_future(asyncio.to_thread(self.store.write_many, batch))
+        try:
+            await asyncio.shield(write)
+        except asyncio.CancelledError:
+            # stop() cancelled the writer mid-flush: let this batch land first
+            try:
+                await write
+            except Exception as e:
+                self._requeue(batch, e)
+            raise
+        except Exception as e:
+            self._requeue(batch, e)
+
+    def _requeue(self, batch, error):
+        # Keep the events for the next attempt rather than losing them
+        self._buffer = batch + self._buffer
+        logger.error("❌ Feedback flush failed: %s", error)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+
+LEGACY_RECORD_RE = re.compile(
+    r"^\[(?P<timestamp>[^\]]+)\]\n"
+    r"Query: (?P<query>.*?)\n"
+    r"Answer: (?P<answer>.*?)\n"
+    r"Source: (?P<source>.*?)\n"
+    r"Feedback: (?P<feedback>.*?)$",
+    re.MULTILINE | re.DOTALL,
+)
+
+def import_legacy_log(store, path="feedback_logs.txt"):
+    """Load the old free-text feedback_logs.txt records into the store."""
+    with open(path, encoding="utf-8") as f:
+        events = [m.groupdict() for m in LEGACY_RECORD_RE.finditer(f.read())]
+    store.write_many(events)
+    return len(events)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Feedback store utilities.")
+    parser.add_argument("--import-log", metavar="PATH", help="Import a legacy feedback_logs.txt")
+    parser.add_argument("--since", help="Only summarise feedback from this timestamp on")
+    args = parser.parse_args()
+
+    store = FeedbackStore()
+    if args.import_log:
+        print(f"✅ Imported {import_legacy_log(store, args.import_log)} records.")
+    for row in store.summary_by_source(since=args.since):
+        print(f"{row['thumbs_up']:>5} 👍 {row['thumbs_down']:>5} 👎  {row['source'] or '(no source)'}")
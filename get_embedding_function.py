@@ -1,17 +1,5 @@
-<<<<<<< HEAD
-from langchain_ollama import OllamaEmbeddings
+from embedding_backends import get_embedding_provider
 
 def get_embedding_function():
-    return OllamaEmbeddings(
-        model="nomic-embed-text:latest", 
-        num_ctx=512
-    )
-=======
-from langchain_ollama import OllamaEmbeddings
-
-def get_embedding_function():
-    return OllamaEmbeddings(
-        model="nomic-embed-text:latest",  # ✅ use correct tag
-        num_ctx=512
-    )
->>>>>>> 21f128ad591456f412735795fb48f8b4568ea0bb
+    # EMBEDDING_BACKEND=ollama EMBEDDING_MODEL=nomic-embed-text:latest for the old Ollama setup
+    return get_embedding_provider()
@@ -0,0 +1,145 @@
+import json
+import logging
+import os
+import shutil
+import time
+from itertools import islice
+import faiss
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from dedup import drop_references, merge_references
+from embedding_backends import EMBED_BATCH_SIZE
+from index_store import CHUNKS_FILE, HEADER_FILE, VECTORS_FILE, SQLiteDocstore, load_faiss_store, save_faiss_store
+
+logger = logging.getLogger(__name__)
+
+# Save a resumable checkpoint every this many batches
+CHECKPOINT_EVERY = int(os.getenv("CHECKPOINT_EVERY_BATCHES", "20"))
+PROGRESS_FILE = "build_progress.json"
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+def with_page_chunk_ids(chunks, file_prefix=lambda filename: filename):
+    """Yield ``(chunk_id, chunk)`` with ids of the form ``<prefix>:<page>:<n>``.
+
+    ``n`` counts chunks within a page, so ids don't depend on the order in
+    which the parser pool returns pages.
+    """
+    counts = {}
+    for chunk in chunks:
+        filename = os.path.basename(chunk.metadata["source"].replace("\\", "/"))
+        page = chunk.metadata.get("page", 0)
+        n = counts[filename, page] = counts.get((filename, page), -1) + 1
+        yield f"{file_prefix(filename)}:{page}:{n}", chunk
+
+def update_metadata(docstore, metadatas):
+    """Replace the metadata of the chunks in ``metadatas`` (``{chunk_id: metadata}``)."""
+    if isinstance(docstore, SQLiteDocstore):
+        docstore.update_metadata(metadatas)
+        return
+    for chunk_id, metadata in metadatas.items():
+        # The in-memory docstore hands out its own Document objects
+        docstore.search(chunk_id).metadata = metadata
+
+def merge_duplicate_sources(docstore, duplicates):
+    """Record every collapsed copy (see dedup.unique_chunks) in its kept chunk's metadata."""
+    update_metadata(docstore, {
+        chunk_id: merge_references(docstore.search(chunk_id).metadata, references)
+        for chunk_id, references in duplicates.items()
+    })
+
+def drop_duplicate_sources(docstore, chunk_ids, filenames):
+    """Forget the copies from ``filenames`` in the metadata of ``chunk_ids``."""
+    update_metadata(docstore, {
+        chunk_id: drop_references(docstore.search(chunk_id).metadata, filenames) for chunk_id in chunk_ids
+    })
+
+def checkpoint_path_for(index_path):
+    return index_path.rstrip("/\\") + ".partial"
+
+def load_checkpoint(checkpoint_path, embedding):
+    """Return ``(db, done_ids)`` from an interrupted build, or ``(None, set())``.
+
+    A checkpoint folder without progress (interrupted before its first
+    checkpoint) is cleared.
+    """
+    progress_path = os.path.join(checkpoint_path, PROGRESS_FILE)
+    if not os.path.exists(progress_path):
+        clear_checkpoint(checkpoint_path)
+        return None, set()
+    with open(progress_path, encoding="utf-8") as f:
+        done_ids = set(json.load(f)["done_ids"])
+    db = load_faiss_store(checkpoint_path, embedding, mmap=False)
+    logger.info("♻️ Resuming interrupted build: %d chunks already embedded.", len(done_ids))
+    return db, done_ids
+
+def checkpoint_docstore(checkpoint_path):
+    """SQLite docstore for a fresh build, so chunk text goes to disk, not memory."""
+    os.makedirs(checkpoint_path, exist_ok=True)
+    return SQLiteDocstore(os.path.join(checkpoint_path, CHUNKS_FILE))
+
+def stage_store(index_path, checkpoint_path, embedding):
+    """Writable copy of the store at ``index_path``, kept in ``checkpoint_path``.
+
+    A sync changes the copy only; the live store is replaced by
+    save_faiss_store() once the sync is complete, so readers and crashes in
+    between never see chunk rows and vectors from different states.
+    """
+    clear_checkpoint(checkpoint_path)
+    os.makedirs(checkpoint_path, exist_ok=True)
+    live = SQLiteDocstore(os.path.join(index_path, CHUNKS_FILE), read_only=True)
+    staged = SQLiteDocstore(os.path.join(checkpoint_path, CHUNKS_FILE))
+    live.copy_to(staged)
+    live.close()
+    staged.close()
+    for name in (VECTORS_FILE, HEADER_FILE):
+        shutil.copyfile(os.path.join(index_path, name), os.path.join(checkpoint_path, name))
+    return load_faiss_store(checkpoint_path, embedding, mmap=False)
+
+def save_checkpoint(db, checkpoint_path, done_ids):
+    save_faiss_store(db, checkpoint_path)
+    progress_path = os.path.join(checkpoint_path, PROGRESS_FILE)
+    with open(progress_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"done_ids": sorted(done_ids)}, f)
+    os.replace(progress_path + ".tmp", progress_path)
+
+def clear_checkpoint(checkpoint_path):
+    if os.path.exists(checkpoint_path):
+        shutil.rmtree(checkpoint_path)
+
+def add_chunks_streaming(db, chunks, embedding, checkpoint_path=None, done_ids=None,
+                         batch_size=EMBED_BATCH_SIZE, checkpoint_every=CHECKPOINT_EVERY):
+    """Embed ``(chunk_id, Document)`` pairs in batches and append them to ``db``.
+
+    ``db`` may be None, in which case the index is created from the first
+    batch, with its chunks in a SQLite docstore inside ``checkpoint_path``
+    when one is given. Only one batch of texts and vectors is in flight at a
+    time. With a ``checkpoint_path`` the index and the ids embedded so far
+    are saved every ``checkpoint_every`` batches; pass the ids from
+    load_checkpoint() as ``done_ids`` to skip them when resuming. Returns
+    the (possibly new) db.
+    """
+    done_ids = set(done_ids or ())
+    started = time.perf_counter()
+    embedded = 0
+    pending = (pair for pair in chunks if pair[0] not in done_ids)
+    for n, batch in enumerate(batched(pending, batch_size), start=1):
+        ids = [chunk_id for chunk_id, _ in batch]
+        texts = [chunk.page_content for _, chunk in batch]
+        metadatas = [chunk.metadata for _, chunk in batch]
+        vectors = embedding.embed_documents(texts)
+        if db is None:
+            docstore = checkpoint_docstore(checkpoint_path) if checkpoint_path else InMemoryDocstore()
+            db = FAISS(embedding, faiss.IndexFlatL2(len(vectors[0])), docstore, {})
+        db.add_embeddings(zip(texts, vectors), metadatas=metadatas, ids=ids)
+        done_ids.update(ids)
+        embedded += len(batch)
+
+        elapsed = time.perf_counter() - started
+        logger.info("📦 Embedded %d chunks (%.1f/s)", embedded, embedded / elapsed)
+        if checkpoint_path and n % checkpoint_every == 0:
+            save_checkpoint(db, checkpoint_path, done_ids)
+    return db
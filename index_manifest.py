@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+
+MANIFEST_FILE = "manifest.json"
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def scan_pdfs(folder_path) -> dict:
+    """Map every PDF file name in ``folder_path`` to its content hash."""
+    return {
+        filename: file_sha256(os.path.join(folder_path, filename))
+        for filename in sorted(os.listdir(folder_path))
+        if filename.endswith(".pdf")
+    }
+
+def load_manifest(index_path):
+    """Return ``{filename: {"sha256": ..., "chunk_ids": [...]}}`` or None if missing."""
+    path = os.path.join(index_path, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["files"]
+
+def save_manifest(index_path, files):
+    os.makedirs(index_path, exist_ok=True)
+    path = os.path.join(index_path, MANIFEST_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"files": files}, f, indent=1)
+    os.replace(tmp_path, path)
+
+def diff_manifest(manifest, current_hashes):
+    """Return ``(changed_or_new, removed)`` file names, comparing by content hash.
+
+    Modified files appear in both lists: their old chunks are removed and the
+    new content is added.
+    """
+    removed = [
+        filename for filename, entry in manifest.items()
+        if filename not in current_hashes or current_hashes[filename] != entry["sha256"]
+    ]
+    added = [
+        filename for filename, sha in current_hashes.items()
+        if filename not in manifest or manifest[filename]["sha256"] != sha
+    ]
+    return added, removed
+
+def remove_files(manifest, filenames):
+    """Drop ``filenames`` from ``manifest``; return ``(stale_ids, shared_ids)``.
+
+    Stale chunks are listed by no remaining file and can be deleted. Shared
+    ones are chunks of the removed files that another file still lists, so
+    they stay.
+    """
+    removed_ids = {chunk_id for filename in filenames for chunk_id in manifest.pop(filename)["chunk_ids"]}
+    referenced = referenced_ids(manifest)
+    return removed_ids - referenced, removed_ids & referenced
+
+def referenced_ids(manifest):
+    """Ids of the chunks some file in ``manifest`` lists."""
+    return {chunk_id for entry in manifest.values() for chunk_id in entry["chunk_ids"]}
+
+def manifest_from_docstore(db, current_hashes):
+    """Adopt an index built before manifests existed.
+
+    Chunks are grouped by the file name in their ``source`` metadata and
+    assumed to match the files currently on disk.
+    """
+    files = {}
+    for doc_id in db.index_to_docstore_id.values():
+        source = db.docstore.search(doc_id).metadata.get("source", "")
+        filename = os.path.basename(source.replace("\\", "/"))
+        files.setdefault(filename, {"sha256": current_hashes.get(filename), "chunk_ids": []})
+        files[filename]["chunk_ids"].append(doc_id)
+    return files
@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+import faiss
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from atomic_files import replacing
+from sqlite_connection import ProcessLocalConnection
+
+logger = logging.getLogger(__name__)
+
+FORMAT_NAME = "zizi-faiss-store"
+FORMAT_VERSION = 1
+HEADER_FILE = "header.json"
+VECTORS_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.sqlite"
+LEGACY_PICKLE_FILE = "index.pkl"
+
+# Map the vectors instead of reading them: every worker then shares the same
+# page-cache pages. IO_FLAG_MMAP_IFC (faiss >= 1.10) extends this to flat codes.
+MMAP_FLAGS = faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+
+
+class SQLiteDocstore(ProcessLocalConnection, Docstore, AddableMixin):
+    """LangChain docstore keeping chunk text and metadata in SQLite.
+
+    Documents are read on demand by primary key instead of being unpickled
+    into every process. Writes stay in an open transaction until commit(),
+    which save_faiss_store calls together with writing the vectors, so the
+    two never disagree on disk. A connection is opened per process, which
+    keeps the store usable in forked workers.
+    """
+
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self.read_only = read_only
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self.read_only:
+            return sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "id TEXT PRIMARY KEY, row INTEGER, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        return conn
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def search(self, search: str):
+        with self._lock:
+            row = self.conn.execute("SELECT text, metadata FROM chunks WHERE id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def add(self, texts: dict[str, Document]) -> None:
+        with self._lock:
+            self.conn.executemany(
+                "INSERT INTO chunks (id, text, metadata) VALUES (?, ?, ?)",
+                [(i, doc.page_content, json.dumps(doc.metadata, default=str)) for i, doc in texts.items()],
+            )
+
+    def delete(self, ids: list) -> None:
+        with self._lock:
+            self.conn.executemany("DELETE FROM chunks WHERE id = ?", [(i,) for i in ids])
+
+    def update_metadata(self, metadatas: dict[str, dict]) -> None:
+        with self._lock:
+            self.conn.executemany(
+                "UPDATE chunks SET metadata = ? WHERE id = ?",
+                [(json.dumps(metadata, default=str), i) for i, metadata in metadatas.items()],
+            )
+
+    def set_rows(self, index_to_docstore_id):
+        """Record the FAISS row of every chunk (rows shift when vectors are removed)."""
+        with self._lock:
+            self.conn.executemany(
+                "UPDATE chunks SET row = ? WHERE id = ?",
+                [(int(row), chunk_id) for row, chunk_id in index_to_docstore_id.items()],
+            )
+
+    def index_to_docstore_id(self) -> dict:
+        with self._lock:
+            return dict(self.conn.execute("SELECT row, id FROM chunks WHERE row IS NOT NULL ORDER BY row"))
+
+    def commit(self):
+        with self._lock:
+            self.conn.commit()
+
+    def copy_to(self, other):
+        self.commit()
+        with self._lock:
+            self.conn.backup(other.conn)
+
+    def close(self):
+        self._close_connection()
+
+
+def read_header(path):
+    header_path = os.path.join(path, HEADER_FILE)
+    if not os.path.exists(header_path):
+        return None
+    with open(header_path, encoding="utf-8") as f:
+        header = json.load(f)
+    if header.get("format") != FORMAT_NAME or header.get("format_version") != FORMAT_VERSION:
+        raise ValueError(
+            f"❗ {path} holds index format {header.get('format')} v{header.get('format_version')}, "
+            f"expected {FORMAT_NAME} v{FORMAT_VERSION}. Rebuild the index."
+        )
+    return header
+
+def store_exists(path):
+    return os.path.exists(os.path.join(path, HEADER_FILE))
+
+def new_store_version():
+    return uuid.uuid4().hex
+
+def store_version(path):
+    """Identifies the store saved in ``path``; changes whenever it is saved again.
+
+    Indexes derived from the store are tagged with it. Stores saved before
+    the header carried a version are identified by the mtime of their vectors.
+    """
+    header = read_header(path)
+    if header is None:
+        raise FileNotFoundError(f"❗ No FAISS store found in '{path}'.")
+    version = header.get("version")
+    return version if version is not None else os.path.getmtime(os.path.join(path, VECTORS_FILE))
+
+def load_faiss_store(path, embedding, mmap=True):
+    """Open a store saved by save_faiss_store without unpickling anything.
+
+    With ``mmap`` the vectors are memory-mapped read-only and the docstore is
+    opened read-only; pass ``mmap=False`` to get a copy that can be updated.
+    """
+    if read_header(path) is None:
+        raise FileNotFoundError(f"❗ No FAISS store found in '{path}'.")
+    index = faiss.read_index(os.path.join(path, VECTORS_FILE), MMAP_FLAGS if mmap else 0)
+    docstore = SQLiteDocstore(os.path.join(path, CHUNKS_FILE), read_only=mmap)
+    return FAISS(embedding, index, docstore, docstore.index_to_docstore_id())
+
+def save_faiss_store(db, path, model_name=None, batch_size=1000, version=None):
+    """Persist ``db``: vectors in index.faiss, chunks in chunks.sqlite, then the header.
+
+    The header is written last, so a store without one is incomplete. It
+    records ``version`` (a new one by default): builders that derive other
+    indexes from ``db`` tag them with it and write them before saving, so
+    they are in place when the new header appears.
+    """
+    os.makedirs(path, exist_ok=True)
+    chunks_path = os.path.join(path, CHUNKS_FILE)
+    docstore = db.docstore
+    if isinstance(docstore, SQLiteDocstore) and os.path.abspath(docstore.path) == os.path.abspath(chunks_path):
+        docstore.set_rows(db.index_to_docstore_id)
+        docstore.commit()
+    else:
+        tmp_path = chunks_path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        out = SQLiteDocstore(tmp_path)
+        if isinstance(docstore, SQLiteDocstore):
+            docstore.copy_to(out)
+        else:
+            ids = list(db.index_to_docstore_id.values())
+            for start in range(0, len(ids), batch_size):
+                out.add({i: docstore.search(i) for i in ids[start:start + batch_size]})
+        out.set_rows(db.index_to_docstore_id)
+        out.commit()
+        out.close()
+        os.replace(tmp_path, chunks_path)
+
+    with replacing(os.path.join(path, VECTORS_FILE)) as (vectors_path,):
+        faiss.write_index(db.index, vectors_path)
+
+    with replacing(os.path.join(path, HEADER_FILE)) as (header_path,):
+        with open(header_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "format": FORMAT_NAME,
+                "format_version": FORMAT_VERSION,
+                "model": model_name,
+                "dim": db.index.d,
+                "ntotal": db.index.ntotal,
+                "metric": "L2",
+                "version": version or new_store_version(),
+            }, f, indent=1)
+
+def migrate_pickle_store(path, embedding, model_name=None):
+    """Convert a LangChain save_local() folder to the SQLite store, once.
+
+    This is the only place a pickle is still loaded, and only for our own
+    legacy index; the pickle is removed afterwards.
+    """
+    pickle_path = os.path.join(path, LEGACY_PICKLE_FILE)
+    if store_exists(path) or not os.path.exists(pickle_path):
+        return False
+    logger.info("🔁 Migrating %s from pickle to the SQLite store...", path)
+    db = FAISS.load_local(path, embedding, allow_dangerous_deserialization=True)
+    save_faiss_store(db, path, model_name)
+    os.remove(pickle_path)
+    return True
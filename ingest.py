@@ -1,77 +1,61 @@
-<<<<<<< HEAD
+import logging
 import os
-from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
+from ann_index import INDEX_TYPE
+from embedding_backends import get_embedding_provider
+from dedup import unique_chunks
+from embedding_cache import CachedEmbeddings, with_embedding_cache
+from index_builder import (add_chunks_streaming, checkpoint_path_for, clear_checkpoint, load_checkpoint,
+                           merge_duplicate_sources, with_page_chunk_ids)
+from index_store import new_store_version, save_faiss_store
+from pdf_pipeline import iter_chunks, iter_pdf_pages, list_pdfs
+from rag import build_derived_indexes
 
 PDF_DIRECTORY = "docs"
 DB_PATH = "data/faiss_index"
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 
 def load_pdfs(directory):
-    documents = []
-    for filename in os.listdir(directory):
-        if filename.endswith(".pdf"):
-            print(f"📄 Loading: {filename}")
-            loader = PyPDFLoader(os.path.join(directory, filename))
-            documents.extend(loader.load())
-    return documents
+    """Yield pages of every PDF in ``directory`` as the parser pool completes them."""
+    return iter_pdf_pages(list_pdfs(directory), clean=False)
 
 def chunk_documents(documents):
     splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    return splitter.split_documents(documents)
+    return iter_chunks(documents, splitter)
 
 def embed_and_store(chunks):
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    vectorstore = FAISS.from_documents(chunks, embeddings)
-
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    vectorstore.save_local(DB_PATH)
-    print(f"💾 Saved FAISS index to {DB_PATH}")
-
-if __name__ == "__main__":
-    print("🧠 Starting PDF ingestion...")
-    documents = load_pdfs(PDF_DIRECTORY)
-    print(f"✅ Loaded {len(documents)} documents.")
-    chunks = chunk_documents(documents)
-    print(f"✂️ Chunked into {len(chunks)} pieces.")
-    embed_and_store(chunks)
-=======
-import os
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-
-PDF_DIRECTORY = "docs"
-DB_PATH = "data/faiss_index"
-
-def load_pdfs(directory):
-    documents = []
-    for filename in os.listdir(directory):
-        if filename.endswith(".pdf"):
-            print(f"📄 Loading: {filename}")
-            loader = PyPDFLoader(os.path.join(directory, filename))
-            documents.extend(loader.load())
-    return documents
-
-def chunk_documents(documents):
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    return splitter.split_documents(documents)
-
-def embed_and_store(chunks):
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    vectorstore = FAISS.from_documents(chunks, embeddings)
-
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    vectorstore.save_local(DB_PATH)
-    print(f"💾 Saved FAISS index to {DB_PATH}")
+    """Embed chunks in batches into DB_PATH, resuming an interrupted run if there is one.
+
+    Chunks repeating an earlier one, exactly or nearly, are skipped; the
+    ``sources`` metadata of the kept chunk lists every copy.
+    """
+    embeddings = with_embedding_cache(get_embedding_provider(EMBEDDING_MODEL))
+    checkpoint_path = checkpoint_path_for(DB_PATH)
+    vectorstore, done_ids = load_checkpoint(checkpoint_path, embeddings)
+    duplicates = {}
+    vectorstore = add_chunks_streaming(
+        vectorstore, unique_chunks(with_page_chunk_ids(chunks), duplicates=duplicates), embeddings, checkpoint_path,
+        done_ids,
+    )
+    if isinstance(embeddings, CachedEmbeddings):
+        embeddings.cache.log_stats()
+    if vectorstore is None:
+        print("❗ No chunks to index.")
+        return
+    merge_duplicate_sources(vectorstore.docstore, duplicates)
+
+    os.makedirs(DB_PATH, exist_ok=True)
+    # The FAISS_INDEX_TYPE, sentence and BM25 indexes go in before the store,
+    # so a server reloading on the new store only has to load them
+    version = new_store_version()
+    build_derived_indexes(vectorstore, embeddings, DB_PATH, embeddings.model_name, INDEX_TYPE, version)
+    save_faiss_store(vectorstore, DB_PATH, embeddings.model_name, version=version)
+    clear_checkpoint(checkpoint_path)
+    print(f"💾 Saved FAISS index to {DB_PATH} ({vectorstore.index.ntotal} chunks)")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     print("🧠 Starting PDF ingestion...")
     documents = load_pdfs(PDF_DIRECTORY)
-    print(f"✅ Loaded {len(documents)} documents.")
     chunks = chunk_documents(documents)
-    print(f"✂️ Chunked into {len(chunks)} pieces.")
     embed_and_store(chunks)
->>>>>>> 21f128ad591456f412735795fb48f8b4568ea0bb
@@ -1,10 +1,73 @@
-from fastapi import FastAPI
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from rag import get_response
+from rag import engine
+from metrics import BATCH_SIZE, REGISTRY, REQUEST_SECONDS, SHED, STREAMS_CANCELLED
+from admission import RETRY_AFTER_SECONDS, AdmissionController, Overloaded, new_deadline, run_to_completion
+from batching import MicroBatcher
+from batch_answer import BATCH_ANSWER_SIZE, answer_batch_at
+from feedback_store import FeedbackStore, FeedbackWriter
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime
 
-app = FastAPI()
+# LOG_LEVEL=DEBUG also logs every query, answer and cache hit
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO"),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the model and indexes off the event loop so the server accepts
+    # connections (and answers /health) straight away.
+    engine.start_background_warm_up()
+    await chat_batcher.start()
+    await feedback_writer.start()
+    yield
+    await chat_batcher.stop()
+    # Drain buffered feedback before the process exits
+    await feedback_writer.stop()
+
+# Concurrent /chat requests are answered together: one encode call and one
+# FAISS search per batch. Tune with CHAT_MAX_BATCH_SIZE / CHAT_MAX_WAIT_MS.
+# Items are (query, deadline); queries whose deadline passed while queued
+# are shed rather than answered late.
+def answer_batch(items):
+    BATCH_SIZE.observe(len(items))
+    now = time.monotonic()
+    # One exception per shed item: each is raised in its own request
+    results = [Overloaded("deadline") for _ in items]
+    live = [i for i, (_, deadline) in enumerate(items) if deadline > now]
+    responses = engine.get_responses([items[i][0] for i in live], deadlines=[items[i][1] for i in live])
+    for i, response in zip(live, responses):
+        results[i] = response
+    return results
+
+chat_batcher = MicroBatcher(answer_batch)
+
+# Feedback is buffered and written to SQLite in batches, off the request path.
+# Tune with FEEDBACK_FLUSH_SIZE / FEEDBACK_FLUSH_SECONDS.
+feedback_store = FeedbackStore()
+feedback_writer = FeedbackWriter(feedback_store)
+
+# Bounded concurrency for the chat endpoints: beyond CHAT_MAX_IN_FLIGHT
+# requests, up to CHAT_MAX_QUEUED wait until their CHAT_DEADLINE_MS deadline
+# and the rest get 503 + Retry-After.
+admission = AdmissionController()
+
+app = FastAPI(lifespan=lifespan)
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    SHED.inc(reason=exc.reason)
+    return JSONResponse(
+        status_code=503, content={"detail": str(exc)}, headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+    )
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,25 +80,148 @@ app.add_middleware(
 class QueryRequest(BaseModel):
     query: str
 
+class BatchRequest(BaseModel):
+    queries: list[str]
+
 class FeedbackRequest(BaseModel):
     query: str
     answer: str
     source: str
     feedback: str
 
+def require_ready():
+    if not engine.ready:
+        raise HTTPException(status_code=503, detail="RAG engine is warming up.", headers={"Retry-After": "5"})
+
+@app.get("/health")
+def health_endpoint():
+    return {"status": "ok"}
+
+@app.get("/ready")
+def ready_endpoint():
+    if engine.ready:
+        return {"status": "ready"}
+    if engine.error is not None:
+        return JSONResponse(status_code=503, content={"status": "failed", "error": str(engine.error)})
+    return JSONResponse(status_code=503, content={"status": "warming_up"})
+
+@app.get("/cache/stats")
+def cache_stats_endpoint():
+    return engine.cache.stats()
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/chat")
-def chat_endpoint(request: QueryRequest):
-    return {"response": get_response(request.query)}
+async def chat_endpoint(request: QueryRequest):
+    require_ready()
+    deadline = new_deadline()
+    async with admission.admit(deadline):
+        with REQUEST_SECONDS.time():
+            return {"response": await chat_batcher.submit((request.query, deadline))}
+
+# Server-sent events: "source" once retrieval is done, one "sentence" per
+# answer sentence, then "done" with the full response. Each stage runs in a
+# worker thread and the connection is checked in between, so an abandoned
+# request stops at the next stage. Streamed queries skip the micro-batcher.
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: QueryRequest, http_request: Request):
+    require_ready()
+    deadline = new_deadline()
+    release = await admission.acquire(deadline)
+    steps = engine.stream_response(request.query, deadline)
+
+    async def events():
+        try:
+            while True:
+                if await http_request.is_disconnected():
+                    STREAMS_CANCELLED.inc()
+                    return
+                step = await run_to_completion(next, steps, None)
+                if step is None:
+                    return
+                event, value = step
+                yield f"event: {event}\ndata: {json.dumps(value, ensure_ascii=False)}\n\n"
+        finally:
+            # A cancelled stage has finished by now (see run_to_completion),
+            # so the slot is only freed once its work is done
+            steps.close()
+            release()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Also runs when the client left before the body started
+        background=BackgroundTask(release),
+    )
+
+# Newline-delimited JSON, one {"index", "query", "answer", "source"} line per
+# query, written as each batch completes, then a {"summary": ...} line with
+# the throughput. Batches run in a worker thread, outside the micro-batcher
+# and the response cache; a disconnected client stops the remaining batches.
+# Each batch takes an admission slot, with its own deadline, like one /chat
+# request: a shed first batch is a 503, a later one ends the stream with an
+# {"error", "reason"} line before the summary.
+@app.post("/chat/batch")
+async def chat_batch_endpoint(request: BatchRequest, http_request: Request):
+    require_ready()
+    deadline = new_deadline()
+    release = await admission.acquire(deadline)
+
+    async def lines():
+        nonlocal deadline, release
+        started = time.perf_counter()
+        answered = 0
+        try:
+            for start in range(0, len(request.queries), BATCH_ANSWER_SIZE):
+                if await http_request.is_disconnected():
+                    return
+                if start:
+                    # Give the slot back so queued requests are not starved by a long batch
+                    release()
+                    deadline = new_deadline()
+                    try:
+                        release = await admission.acquire(deadline)
+                    except Overloaded as e:
+                        SHED.inc(reason=e.reason)
+                        yield json.dumps({"error": str(e), "reason": e.reason}) + "\n"
+                        break
+                batch = await run_to_completion(
+                    answer_batch_at, engine, request.queries, start, BATCH_ANSWER_SIZE, deadline
+                )
+                answered += len(batch)
+                yield "".join(
+                    json.dumps({"index": i, "query": query, **response}, ensure_ascii=False) + "\n"
+                    for i, query, response in batch
+                )
+        finally:
+            release()
+        elapsed = time.perf_counter() - started
+        yield json.dumps({"summary": {
+            "answered": answered,
+            "seconds": round(elapsed, 3),
+            "queries_per_second": round(answered / elapsed, 1) if elapsed else None,
+        }}) + "\n"
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        # Also runs when the client left before the body started
+        background=BackgroundTask(lambda: release()),
+    )
 
 @app.post("/feedback")
-def feedback_endpoint(request: FeedbackRequest):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open("feedback_logs.txt", "a", encoding="utf-8") as f:
-        f.write(
-            f"[{timestamp}]\n"
-            f"Query: {request.query}\n"
-            f"Answer: {request.answer}\n"
-            f"Source: {request.source}\n"
-            f"Feedback: {request.feedback}\n\n"
-        )
+async def feedback_endpoint(request: FeedbackRequest):
+    feedback_writer.submit({
+        "query": request.query,
+        "answer": request.answer,
+        "source": request.source,
+        "feedback": request.feedback,
+    })
     return {"message": "✅ Feedback logged successfully."}
+
+@app.get("/feedback/summary")
+def feedback_summary_endpoint(since: str | None = None, until: str | None = None):
+    return {"sources": feedback_store.summary_by_source(since=since, until=until)}
@@ -0,0 +1,297 @@
+import bisect
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+# Set RAG_METRICS=0 to turn every timer and counter into a no-op
+METRICS_ENABLED = os.getenv("RAG_METRICS", "1") == "1"
+# Directory shared by the server workers (serve.py sets it): each process
+# writes its values to its own file there and /metrics sums all of them
+METRICS_DIR = os.getenv("RAG_METRICS_DIR")
+
+# Seconds; the pipeline stages range from ~0.1 ms (ranking) to seconds (cold encode)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_string(labelnames, values, worker=True):
+    # Without METRICS_DIR each worker only reports its own metrics, so every
+    # sample says whose they are; sum over ``worker`` for the whole server
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if worker:
+        pairs.append(f'worker="{os.getpid()}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value):
+    return int(value) if float(value).is_integer() else value
+
+
+class _ProcessFile:
+    """This process's metric values, memory-mapped in a file of METRICS_DIR.
+
+    Each process writes only its own file, so an update is a store into
+    memory, and files of exited workers keep counting towards the totals.
+    The file holds the length in use, then records of a key length, the key
+    (JSON, padded so the value is 8-byte aligned) and a float64 value. A
+    record is complete before the length in use covers it, so readers never
+    see half of one.
+    """
+
+    USED = struct.Struct("<Q")
+    LENGTH = struct.Struct("<I")
+    VALUE = struct.Struct("<d")
+    INITIAL_SIZE = 1 << 16
+
+    def __init__(self, path):
+        self._file = open(path, "w+b")
+        self._file.truncate(self.INITIAL_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), self.INITIAL_SIZE)
+        self._used = self.USED.size
+        self.USED.pack_into(self._map, 0, self._used)
+        self._positions = {}
+
+    def add(self, key, amount):
+        position = self._positions.get(key)
+        if position is None:
+            position = self._append(key)
+        self.VALUE.pack_into(self._map, position, self.VALUE.unpack_from(self._map, position)[0] + amount)
+
+    def _append(self, key):
+        encoded = key.encode("utf-8")
+        padded = len(encoded) + -(self.LENGTH.size + len(encoded)) % 8
+        size = self.LENGTH.size + padded + self.VALUE.size
+        if self._used + size > len(self._map):
+            new_size = max(2 * len(self._map), self._used + size)
+            self._map.close()
+            self._file.truncate(new_size)
+            self._map = mmap.mmap(self._file.fileno(), new_size)
+        start = self._used
+        self.LENGTH.pack_into(self._map, start, len(encoded))
+        self._map[start + self.LENGTH.size:start + self.LENGTH.size + len(encoded)] = encoded
+        position = start + self.LENGTH.size + padded
+        self.VALUE.pack_into(self._map, position, 0.0)
+        self._used += size
+        self.USED.pack_into(self._map, 0, self._used)
+        self._positions[key] = position
+        return position
+
+    @classmethod
+    def read(cls, path):
+        """``{key: value}`` of a file written by any process."""
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < cls.USED.size:
+            return {}
+        used = min(cls.USED.unpack_from(data)[0], len(data))
+        values = {}
+        position = cls.USED.size
+        while position + cls.LENGTH.size <= used:
+            length = cls.LENGTH.unpack_from(data, position)[0]
+            padded = length + -(cls.LENGTH.size + length) % 8
+            key = data[position + cls.LENGTH.size:position + cls.LENGTH.size + length].decode("utf-8")
+            values[key] = cls.VALUE.unpack_from(data, position + cls.LENGTH.size + padded)[0]
+            position += cls.LENGTH.size + padded + cls.VALUE.size
+        return values
+
+
+_process_file = None
+_process_file_lock = threading.Lock()
+
+def _forget_process_file():
+    # A forked worker writes its own file, not the one it inherited
+    global _process_file, _process_file_lock
+    _process_file = None
+    _process_file_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_forget_process_file)
+
+def _shared_add(metric_name, labels, field, amount):
+    global _process_file
+    key = json.dumps([metric_name, list(labels), field])
+    with _process_file_lock:
+        if _process_file is None:
+            _process_file = _ProcessFile(os.path.join(METRICS_DIR, f"{os.getpid()}.metrics"))
+        _process_file.add(key, amount)
+
+def read_shared_values(directory):
+    """``{metric name: {(labels, field): value}}`` summed over the files of every process in ``directory``."""
+    totals = {}
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".metrics"):
+            continue
+        for key, value in _ProcessFile.read(os.path.join(directory, filename)).items():
+            metric_name, labels, field = json.loads(key)
+            values = totals.setdefault(metric_name, {})
+            values[tuple(labels), field] = values.get((tuple(labels), field), 0.0) + value
+    return totals
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        if METRICS_DIR:
+            _shared_add(self.name, key, None, amount)
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def samples(self, shared=None):
+        """Sample lines of this process, or of ``shared`` values from read_shared_values()."""
+        if shared is None:
+            with self._lock:
+                values = dict(self._values)
+        else:
+            values = {key: value for (key, _), value in shared.items()}
+        for key, value in sorted(values.items()):
+            yield f"{self.name}_total{_label_string(self.labelnames, key, shared is None)} {_number(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = tuple(labels[name] for name in self.labelnames)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][slot] += 1
+            entry[1] += value
+            entry[2] += 1
+        if METRICS_DIR:
+            _shared_add(self.name, key, slot, 1)
+            _shared_add(self.name, key, "sum", value)
+            _shared_add(self.name, key, "count", 1)
+
+    @contextmanager
+    def time(self, **labels):
+        if not METRICS_ENABLED:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self, shared=None):
+        """Sample lines of this process, or of ``shared`` values from read_shared_values()."""
+        if shared is None:
+            with self._lock:
+                values = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+        else:
+            values = {}
+            for (key, field), value in shared.items():
+                entry = values.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+                if field == "sum":
+                    entry[1] = value
+                elif field == "count":
+                    entry[2] = value
+                else:
+                    entry[0][field] = value
+        worker = shared is None
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _label_string(self.labelnames + ("le",), key + (le,), worker)
+                yield f"{self.name}_bucket{labels} {_number(cumulative)}"
+            labels = _label_string(self.labelnames, key, worker)
+            yield f"{self.name}_sum{labels} {total}"
+            yield f"{self.name}_count{labels} {_number(count)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"❗ Metric {metric.name} is already registered.")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4).
+
+        With METRICS_DIR the samples are the totals of every process.
+        """
+        shared = read_shared_values(METRICS_DIR) if METRICS_DIR else None
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples(None if shared is None else shared.get(metric.name, {})))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "rag_stage_seconds",
+    "Time spent per RAG pipeline stage (encode and retrieve are per batch, the rest per query).",
+    labelnames=("stage",),
+)
+QUERIES = REGISTRY.counter("rag_queries", "Queries received by the RAG engine.")
+CACHE_HITS = REGISTRY.counter("rag_cache_hits", "Queries answered from the response cache.", labelnames=("tier",))
+FAQ_HITS = REGISTRY.counter("rag_faq_hits", "Queries answered from the FAQ tier.", labelnames=("match",))
+CACHE_MISSES = REGISTRY.counter("rag_cache_misses", "Queries that went through retrieval.")
+FALLBACKS = REGISTRY.counter("rag_fallbacks", "Answers that fell back to the raw chunk text.")
+EMPTY_RESULTS = REGISTRY.counter("rag_empty_results", "Queries for which retrieval found no chunks.")
+REQUEST_SECONDS = REGISTRY.histogram(
+    "chat_request_seconds", "End-to-end latency of /chat requests, including batching.",
+)
+STREAMS_CANCELLED = REGISTRY.counter(
+    "chat_streams_cancelled", "Streamed /chat requests stopped early because the client disconnected.",
+)
+SHED = REGISTRY.counter(
+    "chat_requests_shed", "Chat requests rejected with 503 to keep latency bounded.", labelnames=("reason",),
+)
+DEGRADED = REGISTRY.counter("rag_degraded", "Answers that skipped re-ranking to meet their deadline.")
+BATCH_SIZE = REGISTRY.histogram(
+    "chat_batch_size", "Number of queries answered per micro-batch.",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+
+def stage(name):
+    """Context manager timing one pipeline stage into rag_stage_seconds."""
+    return STAGE_SECONDS.time(stage=name)
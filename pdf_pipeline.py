@@ -0,0 +1,125 @@
+import logging
+import multiprocessing
+import os
+import re
+import time
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+import fitz
+from langchain_core.documents import Document
+from text_cleaning import remove_boilerplate
+
+logger = logging.getLogger(__name__)
+
+# Large PDFs are split into page ranges of this size so one long report
+# doesn't end up on a single worker.
+PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "40"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "0")) or os.cpu_count() or 1
+
+YEAR_IN_NAME_RE = re.compile(r"(?<!\d)(20\d\d)(?!\d)")
+YEAR_IN_DATE_RE = re.compile(r"(20\d\d)")
+
+def extract_year(file_path, doc_metadata=None):
+    """Report year from the file name, falling back to the PDF creation date."""
+    filename = os.path.basename(file_path.replace("\\", "/"))
+    match = YEAR_IN_NAME_RE.search(filename)
+    if match is None and doc_metadata:
+        match = YEAR_IN_DATE_RE.search(doc_metadata.get("creationdate", ""))
+    return int(match.group(1)) if match else None
+
+def list_pdfs(folder_path):
+    return [
+        os.path.join(folder_path, filename)
+        for filename in sorted(os.listdir(folder_path))
+        if filename.endswith(".pdf")
+    ]
+
+def _parse_pages(file_path, start, end, clean):
+    """Parse pages ``[start, end)`` of one PDF. Runs in a worker process."""
+    started = time.perf_counter()
+    pages = []
+    with fitz.open(file_path) as pdf:
+        doc_metadata = {k.lower(): v for k, v in (pdf.metadata or {}).items() if v}
+        # Structured fields for filtered search; Chroma rejects None values
+        doc_metadata["document"] = os.path.basename(file_path)
+        year = extract_year(file_path, doc_metadata)
+        if year is not None:
+            doc_metadata["year"] = year
+        for n in range(start, end):
+            text = pdf[n].get_text()
+            if clean:
+                text = remove_boilerplate(text)
+            pages.append(Document(
+                page_content=text,
+                metadata={
+                    **doc_metadata,
+                    "source": file_path,
+                    "file_path": file_path,
+                    "page": n,
+                    "total_pages": pdf.page_count,
+                },
+            ))
+    return file_path, pages, time.perf_counter() - started
+
+def _plan_tasks(paths, pages_per_task):
+    tasks = []
+    for path in paths:
+        with fitz.open(path) as pdf:
+            page_count = pdf.page_count
+        for start in range(0, page_count, pages_per_task):
+            tasks.append((path, start, min(start + pages_per_task, page_count)))
+    return tasks
+
+def iter_pdf_pages(paths, clean=True, max_workers=PDF_WORKERS, pages_per_task=PAGES_PER_TASK):
+    """Yield one Document per page of ``paths``, in file and page order.
+
+    Files (and page ranges of large files) are parsed in a process pool.
+    Only a window of ``2 * max_workers`` ranges is in flight at a time and
+    each range is dropped once its pages are yielded, so parsing that runs
+    ahead of the consumer (embedding is much slower) never holds more than
+    that window in memory. ``clean`` runs remove_boilerplate inside the
+    worker. Per-file parse time is logged when the last range of a file
+    completes.
+    """
+    tasks = _plan_tasks(paths, pages_per_task)
+    remaining = {}
+    for path, _, _ in tasks:
+        remaining[path] = remaining.get(path, 0) + 1
+    parse_seconds = dict.fromkeys(remaining, 0.0)
+    page_counts = dict.fromkeys(remaining, 0)
+
+    def finished(path, pages, seconds):
+        remaining[path] -= 1
+        parse_seconds[path] += seconds
+        page_counts[path] += len(pages)
+        if remaining[path] == 0:
+            logger.info("📄 Parsed %s: %d pages in %.2fs", path, page_counts[path], parse_seconds[path])
+
+    if max_workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            path, pages, seconds = _parse_pages(*task, clean)
+            finished(path, pages, seconds)
+            yield from pages
+        return
+
+    # spawn, not fork: the caller may already hold torch threads and a loaded model
+    context = multiprocessing.get_context("spawn")
+    workers = min(max_workers, len(tasks))
+    queued = iter(tasks)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        in_flight = deque(pool.submit(_parse_pages, *task, clean) for task in islice(queued, 2 * workers))
+        while in_flight:
+            path, pages, seconds = in_flight.popleft().result()
+            # Refill before handing the pages over, so workers stay busy
+            # while the consumer embeds them
+            task = next(queued, None)
+            if task is not None:
+                in_flight.append(pool.submit(_parse_pages, *task, clean))
+            finished(path, pages, seconds)
+            yield from pages
+
+def iter_chunks(pages, text_splitter):
+    """Split pages one at a time as they arrive from iter_pdf_pages."""
+    for page in pages:
+        yield from text_splitter.split_documents([page])
@@ -1,43 +1,60 @@
 import argparse
+import hashlib
+import logging
+from collections.abc import Iterable
+from itertools import chain
 import os
 import shutil
-from langchain_community.document_loaders import PyPDFDirectoryLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain.schema.document import Document
 from get_embedding_function import get_embedding_function
 from langchain_chroma import Chroma
-from langchain_community.retrievers import BM25Retriever
+from bm25_index import BM25Index
+from embedding_backends import EMBED_BATCH_SIZE, check_model_marker
+from embedding_cache import CachedEmbeddings, with_embedding_cache
+from dedup import merge_references, unique_chunks
+from faq_index import FAQ_PATH
+from index_builder import batched
+from pdf_pipeline import iter_chunks, iter_pdf_pages, list_pdfs
 import json
 
 CHROMA_PATH = "chroma"
+BM25_PATH = "bm25_index"
 DATA_PATH = "data"
-FAQ_PATH = "faqs.json"  # New: Preloaded FAQs
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--reset", action="store_true", help="Reset the database.")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="Chunks per Chroma call.")
     args = parser.parse_args()
     
     if args.reset:
         clear_database()
 
-    # Load documents and FAQs
+    # Load documents and FAQs; pages stream in file and page order, so
+    # chunks go to Chroma batch by batch without holding the corpus
     documents = load_documents()
-    chunks = split_documents(documents)
-    faq_chunks = load_faqs() if os.path.exists(FAQ_PATH) else []
-    
+    # Repeated chunks (report boilerplate) are stored once, citing every copy
+    duplicates = {}
+    chunks = (
+        chunk for _, chunk in unique_chunks(
+            ((c.metadata["id"], c) for c in calculate_chunk_ids(split_documents(documents))), duplicates=duplicates
+        )
+    )
+    faq_chunks = calculate_chunk_ids(load_faqs()) if os.path.exists(FAQ_PATH) else []
+
     # Store in Chroma
-    add_to_chroma(chunks + faq_chunks)
-    
-    # Create BM25 retriever for hybrid search
-    create_bm25_index(chunks)
+    db, changed_files = add_to_chroma(chain(chunks, faq_chunks), args.batch_size)
+    update_sources(db, duplicates, changed_files, args.batch_size * 16)
+
+    # Create BM25 index for hybrid search
+    create_bm25_index(db, args.batch_size * 16)
 
 def load_documents():
     print(f"Loading documents from {DATA_PATH}")
-    loader = PyPDFDirectoryLoader(DATA_PATH)
-    return loader.load()
+    return iter_pdf_pages(list_pdfs(DATA_PATH), clean=False)
 
-def split_documents(documents: list[Document]):
+def split_documents(documents: Iterable[Document]):
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=1200,
         chunk_overlap=300,
@@ -46,7 +63,7 @@ def split_documents(documents: list[Document]):
         length_function=len,
         is_separator_regex=False,
     )
-    return text_splitter.split_documents(documents)
+    return iter_chunks(documents, text_splitter)
 
 def load_faqs():
     with open(FAQ_PATH) as f:
@@ -62,42 +79,161 @@ def load_faqs():
         ) for question, answer in faqs.items()
     ]
 
-def add_to_chroma(chunks: list[Document]):
+def add_to_chroma(chunks: Iterable[Document], batch_size: int = EMBED_BATCH_SIZE):
+    """Sync Chroma with ``chunks`` (with ids from calculate_chunk_ids): add the new ones, delete the ones that are gone.
+
+    Ids are derived from chunk content, so unchanged chunks keep their ids
+    and are neither fetched nor re-embedded. Chunks are consumed a batch at
+    a time; only their ids are kept. Returns the Chroma store and the names
+    of the files that had chunks added or deleted.
+    """
+    embedding_function = with_embedding_cache(get_embedding_function())
+    # Chroma has no header to record the model in
+    check_model_marker(CHROMA_PATH, embedding_function.model_name)
     db = Chroma(
         persist_directory=CHROMA_PATH,
-        embedding_function=get_embedding_function()
+        embedding_function=embedding_function
     )
-    
-    chunks_with_ids = calculate_chunk_ids(chunks)
-    existing_ids = set(db.get()["ids"])
-    new_chunks = [c for c in chunks_with_ids if c.metadata["id"] not in existing_ids]
-
-    if new_chunks:
-        print(f"Adding {len(new_chunks)} new documents")
-        db.add_documents(
-            new_chunks,
-            ids=[c.metadata["id"] for c in new_chunks]
-        )
+
+    current_ids = set()
+    changed_files = set()
+    added = 0
+    for batch in batched(chunks, batch_size):
+        ids = [c.metadata["id"] for c in batch]
+        current_ids.update(ids)
+        # Ask only for this batch's ids instead of pulling the whole collection
+        existing_ids = set(db.get(ids=ids, include=[])["ids"])
+        new_chunks = [c for c in batch if c.metadata["id"] not in existing_ids]
+        if new_chunks:
+            # Chroma persists every batch, so an interrupted run resumes from
+            # the existing-id check above instead of starting over.
+            db.add_documents(new_chunks, ids=[c.metadata["id"] for c in new_chunks])
+            changed_files.update(chunk_file(c.metadata["id"]) for c in new_chunks)
+            added += len(new_chunks)
+            print(f"Added {added} new documents")
+    if added:
+        if isinstance(embedding_function, CachedEmbeddings):
+            embedding_function.cache.log_stats()
     else:
         print("No new documents to add")
 
-def create_bm25_index(chunks):
-    # Save chunks for hybrid search
-    with open("bm25_chunks.json", "w") as f:
-        json.dump([{"text": c.page_content, "metadata": c.metadata} for c in chunks], f)
+    stale_ids = list(stored_ids(db, batch_size * 16) - current_ids)
+    if stale_ids:
+        print(f"Deleting {len(stale_ids)} chunks of changed or removed documents")
+        changed_files.update(chunk_file(chunk_id) for chunk_id in stale_ids)
+        for batch in batched(stale_ids, batch_size):
+            db.delete(ids=batch)
+    return db, changed_files
+
+def update_sources(db, duplicates, changed_files, page_size):
+    """Record the copies collapsed into each chunk (see dedup.unique_chunks) in its metadata.
+
+    Chroma metadata values must be scalars, so ``sources`` is stored as JSON,
+    ``years`` as comma-separated years and ``copies`` as the number of other
+    copies, which is what finds the chunks citing any. Only a chunk of one
+    of ``changed_files``, or with a copy in one, can need an update; chunks
+    that no longer have copies go back to citing only themselves.
+    """
+    if not changed_files:
+        return
+
+    def cites_changed_file(references):
+        return any(source_file(r["source"]) in changed_files for r in references)
+
+    candidates = {
+        chunk_id for chunk_id, references in duplicates.items()
+        if chunk_file(chunk_id) in changed_files or cites_changed_file(references)
+    }
+    offset = 0
+    while (page := db.get(where={"copies": {"$gt": 0}}, include=["metadatas"], limit=page_size, offset=offset))["ids"]:
+        for chunk_id, stored in zip(page["ids"], page["metadatas"]):
+            if cites_changed_file(json.loads(stored["sources"])):
+                candidates.add(chunk_id)
+        offset += len(page["ids"])
+
+    updated = 0
+    for ids in batched(sorted(candidates), page_size):
+        page = db.get(ids=list(ids), include=["metadatas", "documents"])
+        changed = []
+        for chunk_id, stored, text in zip(page["ids"], page["metadatas"], page["documents"]):
+            # Rebuilt from the chunk's own source, so copies of removed files go away
+            metadata = {k: v for k, v in stored.items() if k not in ("sources", "years", "copies")}
+            if duplicates.get(chunk_id):
+                merged = merge_references(metadata, duplicates[chunk_id])
+                metadata.update(
+                    sources=json.dumps(merged["sources"]),
+                    years=",".join(str(year) for year in merged["years"]),
+                    copies=len(merged["sources"]) - 1,
+                )
+            if metadata != stored:
+                changed.append((chunk_id, Document(page_content=text, metadata=metadata)))
+        if changed:
+            # Re-embedding the unchanged text is served by the embedding cache
+            db.update_documents(ids=[chunk_id for chunk_id, _ in changed], documents=[doc for _, doc in changed])
+            updated += len(changed)
+    if updated:
+        print(f"Recorded the duplicate copies of {updated} chunks")
+
+def stored_ids(db, page_size):
+    """Every id in the collection, paged, without documents or metadata."""
+    ids = set()
+    offset = 0
+    while page := db.get(include=[], limit=page_size, offset=offset)["ids"]:
+        ids.update(page)
+        offset += len(page)
+    return ids
+
+def create_bm25_index(db, page_size):
+    # Binary inverted index for hybrid search over the stored document
+    # chunks (not the FAQs), keyed by the Chroma chunk ids and read back a
+    # page at a time
+    def pages():
+        offset = 0
+        while True:
+            page = db.get(
+                where={"source": {"$ne": "preloaded_faq"}}, include=["documents"], limit=page_size, offset=offset
+            )
+            if not page["ids"]:
+                return
+            yield from zip(page["ids"], page["documents"])
+            offset += len(page["ids"])
+
+    index = BM25Index.build(pages())
+    index.save(BM25_PATH)
+    print(f"Saved BM25 index for {len(index)} chunks")
+
+def source_file(source):
+    return os.path.basename(source.replace("\\", "/"))
+
+def chunk_file(chunk_id):
+    """The file name in an id from calculate_chunk_ids."""
+    return chunk_id.rsplit(":", 2)[0]
 
 def calculate_chunk_ids(chunks):
-    for i, chunk in enumerate(chunks):
-        source = chunk.metadata.get("source", "unknown")
-        page = chunk.metadata.get("page", 0)
-        chunk.metadata["id"] = f"{source}:{page}:{i}"
-    return chunks
+    """Give every chunk the id ``<file>:<content hash>:<n>``.
+
+    ``n`` counts the earlier chunks of the same file with the same text, so
+    repeated chunks within a file stay distinct. The page is only kept in
+    the metadata: inserting, removing or editing a page leaves the ids of
+    every other chunk alone, including those whose page number moved.
+    Yields the chunks as it goes.
+    """
+    seen = {}
+    for chunk in chunks:
+        source = source_file(chunk.metadata.get("source", "unknown"))
+        digest = hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest()[:16]
+        n = seen[source, digest] = seen.get((source, digest), -1) + 1
+        chunk.metadata["id"] = f"{source}:{digest}:{n}"
+        yield chunk
 
 def clear_database():
     if os.path.exists(CHROMA_PATH):
         shutil.rmtree(CHROMA_PATH)
+    if os.path.exists(BM25_PATH):
+        shutil.rmtree(BM25_PATH)
     if os.path.exists("bm25_chunks.json"):
         os.remove("bm25_chunks.json")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     main()
@@ -1,10 +1,9 @@
-from rag import get_answer
+from rag import get_response
 
 def query_rag(question: str, verbose: bool = False) -> str:
     if verbose:
         print(f"[query_rag] Question received: {question}")
-    answer = get_answer(question)
+    answer = get_response(question)["answer"]
     if verbose:
         print(f"[query_rag] Answer generated: {answer}")
     return answer
-
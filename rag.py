@@ -1,92 +1,67 @@
+import logging
 import os
-import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import faiss
 import nltk
-from nltk.tokenize import sent_tokenize
-from sentence_transformers import SentenceTransformer, util
-from langchain_community.document_loaders import PyMuPDFLoader
+import numpy as np
 from langchain_text_splitters import CharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-
-nltk.download("punkt")
-
-sentence_model = SentenceTransformer("all-MiniLM-L6-v2")
+from ann_index import INDEX_TYPE, load_ann_index, load_or_build_ann_index, search_parameters
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from dedup import Deduplicator, source_reference
+from cache import ResponseCache
+from index_builder import (add_chunks_streaming, checkpoint_path_for, clear_checkpoint, drop_duplicate_sources, load_checkpoint,
+                           merge_duplicate_sources, stage_store, with_page_chunk_ids)
+from embedding_backends import EMBEDDING_MODEL, ensure_same_model, get_embedding_provider
+from embedding_cache import CachedEmbeddings, with_embedding_cache
+from faq_index import FAQIndex
+from index_store import (load_faiss_store, migrate_pickle_store, new_store_version, read_header, save_faiss_store,
+                         store_exists, store_version)
+from metrics import CACHE_HITS, CACHE_MISSES, DEGRADED, EMPTY_RESULTS, FALLBACKS, FAQ_HITS, QUERIES, stage
+from index_manifest import (diff_manifest, load_manifest, manifest_from_docstore, referenced_ids, remove_files,
+                            save_manifest, scan_pdfs)
+from pdf_pipeline import extract_year, iter_chunks, iter_pdf_pages, list_pdfs
+from sentence_index import SentenceIndex
+
+logger = logging.getLogger(__name__)
+
+# The sentence model, recorded in the index headers; follows EMBEDDING_MODEL
+MODEL_NAME = EMBEDDING_MODEL
 
 DOCS_FOLDER = "docs"
 INDEX_FILE = "faiss_index"
-
-def clean_text(text: str) -> str:
-    text = re.sub(r'\n{2,}', '\n', text)
-    text = re.sub(r'(?<!\n)\n(?!\n)', ' ', text)
-    text = re.sub(r' +', ' ', text)
-    lines = [line.strip() for line in text.split('\n')]
-    return '\n'.join(lines)
-
-def clean_sentence(sentence: str) -> str:
-    return re.sub(r"^[\s\-–•]*([a-zA-Z0-9]{1,2})[\.\)]\s+", "", sentence).strip()
-
-def remove_boilerplate(text: str) -> str:
-    lines = text.split("\n")
-    cleaned = []
-    for line in lines:
-        line = line.strip()
-        if any(x in line.lower() for x in ["www.ziziafrique", "info@ziziafrique", "follow us", "annual report", "contents"]):
-            continue
-        if re.fullmatch(r"[0-9\s\W]+", line):
-            continue
-        cleaned.append(line)
-    return "\n".join(cleaned)
-
-def load_documents(folder_path):
-    documents = []
-    for filename in os.listdir(folder_path):
-        if filename.endswith(".pdf"):
-            file_path = os.path.join(folder_path, filename)
-            print(f"📄 Loading: {file_path}")
-            loader = PyMuPDFLoader(file_path)
-            pages = loader.load()
-            for page in pages:
-                page.page_content = remove_boilerplate(page.page_content)
-            documents.extend(pages)
-    return documents
-
-def create_or_load_faiss_index():
-    if os.path.exists(INDEX_FILE):
-        print("💾 Loading existing FAISS index...")
-        return FAISS.load_local(
-            INDEX_FILE,
-            HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2"),
-            allow_dangerous_deserialization=True
-        )
-
-    docs = load_documents(DOCS_FOLDER)
-    if not docs:
-        raise ValueError("❗ No PDF files found in the 'docs/' folder.")
-
-    print(f"✅ Loaded {len(docs)} raw documents.")
-    text_splitter = CharacterTextSplitter(chunk_size=800, chunk_overlap=150)
-    split_docs = text_splitter.split_documents(docs)
-
-    if not split_docs:
-        raise ValueError("❗ No text chunks found after splitting documents.")
-
-    print(f"✂️ Split into {len(split_docs)} chunks.")
-    embedding = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-
-    print("📦 Creating FAISS index...")
-    db = FAISS.from_documents(split_docs, embedding)
-    db.save_local(INDEX_FILE)
-    print("✅ FAISS index created and saved.")
-    return db
-
-db = create_or_load_faiss_index()
-
-def get_response(query: str) -> dict:
-    print(f"\n🔎 Received query: {query}")
-
-    if not query.strip():
-        return {"answer": "❗ Please enter a valid query.", "source": None}
-
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 150
+# Chunks retrieved per query
+TOP_K = int(os.getenv("RAG_TOP_K", "5"))
+
+# Dense + BM25 retrieval fused with reciprocal rank fusion; each side
+# contributes HYBRID_CANDIDATES candidates before fusing down to k.
+HYBRID_SEARCH = os.getenv("RAG_HYBRID_SEARCH", "1") == "1"
+HYBRID_CANDIDATES = int(os.getenv("RAG_HYBRID_CANDIDATES", "20"))
+# A query with less than this left of its deadline after retrieval skips
+# sentence re-ranking and answers with the top chunk's sentences as they are
+RANK_RESERVE_MS = float(os.getenv("RAG_RANK_RESERVE_MS", "50"))
+# Seconds between checks for an index rebuilt on disk; 0 never reloads
+INDEX_CHECK_SECONDS = float(os.getenv("RAG_INDEX_CHECK_SECONDS", "10"))
+
+# Set RAG_OFFLINE=1 on nodes without internet access: punkt must then be
+# present in the local nltk data path instead of being downloaded.
+OFFLINE = os.getenv("RAG_OFFLINE", "0") == "1"
+
+def ensure_punkt():
+    """Resolve the sentence tokenizer locally, downloading it only when missing."""
+    try:
+        nltk.data.find("tokenizers/punkt_tab")
+        return
+    except LookupError:
+        if OFFLINE:
+            raise LookupError("❗ nltk 'punkt_tab' data not found and RAG_OFFLINE=1 forbids downloading it.")
+    logger.info("⬇️ Downloading nltk punkt tokenizer...")
+    nltk.download("punkt_tab", quiet=True)
+
+def detect_expected_year(query: str):
     # Detect expected year from the query
     expected_year = None
     known_years = ["2020", "2021", "2022", "2023", "2024"]
@@ -99,79 +74,655 @@ def get_response(query: str) -> dict:
     future_keywords = ["2024", "beyond", "future", "next year", "vision", "looking ahead"]
     if any(k in query.lower() for k in future_keywords):
         expected_year = "2023"
+    return expected_year
 
-    docs = db.similarity_search(query, k=5)
-    print(f"📄 Chunks retrieved: {len(docs)}")
+def index_version(index_path=INDEX_FILE):
+    """Identifies the index on disk; changes whenever it is rebuilt and saved."""
+    return store_version(index_path)
 
-    # Prefer docs from expected year and newer (e.g., 2023+ for "2024 goals")
-    if expected_year:
+def load_documents(folder_path):
+    """Yield the cleaned pages of every PDF in ``folder_path``, parsed in parallel."""
+    return iter_pdf_pages(list_pdfs(folder_path))
+
+def split_documents(pages, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """Lazily split pages into chunks as they arrive."""
+    text_splitter = CharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return iter_chunks(pages, text_splitter)
+
+def create_or_load_faiss_index(embedding, index_path=INDEX_FILE, docs_folder=DOCS_FOLDER, model_name=MODEL_NAME,
+                               chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, index_type=INDEX_TYPE):
+    """Load the FAISS index and bring it in line with the PDFs in ``docs_folder``.
+
+    manifest.json records the content hash and chunk ids of every indexed
+    file. Only new or modified PDFs are parsed and embedded; the chunks of
+    modified or deleted ones are removed from the index in place. A new
+    chunk that repeats an indexed one, exactly or nearly, is not embedded
+    again: the manifest lists the kept chunk under every file containing it,
+    and the chunk stays until none of them does.
+
+    The index is served from index_store: vectors memory-mapped, chunk text
+    read from SQLite on demand. Changes are applied to a copy staged in the
+    checkpoint folder, which replaces the served files when it is saved. The
+    ANN, sentence and BM25 indexes of the new version are written first, so
+    servers that reload on the new header find them ready.
+    """
+    db = None
+    manifest = None
+    migrate_pickle_store(index_path, embedding, model_name)
+    if store_exists(index_path):
+        ensure_same_model(read_header(index_path).get("model"), model_name, index_path)
+        logger.info("💾 Loading existing FAISS index...")
+        db = load_faiss_store(index_path, embedding)
+        if not os.path.isdir(docs_folder):
+            # Serving nodes may only ship the index
+            return db
+        manifest = load_manifest(index_path)
+
+    if not os.path.isdir(docs_folder):
+        raise ValueError(f"❗ No PDF files found in the '{docs_folder}/' folder.")
+
+    current_hashes = scan_pdfs(docs_folder)
+    if db is not None and manifest is None:
+        logger.info("🗂️ No manifest found, adopting the existing index as up to date.")
+        manifest = manifest_from_docstore(db, current_hashes)
+        save_manifest(index_path, manifest)
+    manifest = manifest or {}
+
+    added, removed = diff_manifest(manifest, current_hashes)
+    if db is not None and not added and not removed:
+        return db
+    if db is None and not added:
+        raise ValueError(f"❗ No PDF files found in the '{docs_folder}/' folder.")
+
+    # An interrupted sync left a checkpoint that already holds part of the work
+    checkpoint_path = checkpoint_path_for(index_path)
+    checkpoint_db, done_ids = load_checkpoint(checkpoint_path, embedding)
+    if checkpoint_db is not None:
+        db = checkpoint_db
+    elif db is not None:
+        # The served copy is never written in place: changes go to a staged
+        # copy that replaces it when the sync is saved
+        db = stage_store(index_path, checkpoint_path, embedding)
+
+    stale_ids, shared_ids = remove_files(manifest, removed)
+    if db is not None:
+        present_ids = set(db.index_to_docstore_id.values())
+        stale_ids = [chunk_id for chunk_id in stale_ids if chunk_id in present_ids]
+        # Shared chunks stay, without the copies of the removed files
+        drop_duplicate_sources(db.docstore, shared_ids & present_ids, set(removed))
+    if stale_ids:
+        logger.info("🗑️ Removing %d chunks of %d changed or deleted files...", len(stale_ids), len(removed))
+        db.delete(stale_ids)
+
+    for filename in added:
+        manifest[filename] = {"sha256": current_hashes[filename], "chunk_ids": []}
+
+    deduplicator = Deduplicator()
+    # Chunks already in the index that this sync did not embed. One of them
+    # can come back under its own id: a shared chunk kept the id of a file
+    # that was removed and is now added again.
+    indexed_ids = set()
+    if db is not None:
+        for chunk_id in db.index_to_docstore_id.values():
+            deduplicator.add(db.docstore.search(chunk_id).page_content, chunk_id)
+        indexed_ids = set(db.index_to_docstore_id.values()) - done_ids
+    # Kept chunk id -> the copies collapsed into it, recorded in its metadata
+    duplicates = {}
+
+    def record_in_manifest(pairs):
+        for chunk_id, chunk in pairs:
+            kept_id = deduplicator.add(chunk.page_content, chunk_id) or chunk_id
+            manifest[os.path.basename(chunk.metadata["source"])]["chunk_ids"].append(kept_id)
+            if kept_id == chunk_id and chunk_id not in indexed_ids:
+                yield chunk_id, chunk
+            else:
+                duplicates.setdefault(kept_id, []).append(source_reference(chunk.metadata))
+
+    pages = iter_pdf_pages([os.path.join(docs_folder, filename) for filename in added])
+    chunks = with_page_chunk_ids(
+        split_documents(pages, chunk_size, chunk_overlap),
+        file_prefix=lambda filename: f"{filename}:{current_hashes[filename][:12]}",
+    )
+    logger.info("📦 Embedding chunks of %d files...", len(added))
+    db = add_chunks_streaming(db, record_in_manifest(chunks), embedding, checkpoint_path, done_ids)
+    if duplicates:
+        logger.info("🧹 Skipped %d duplicate chunks.", sum(map(len, duplicates.values())))
+        merge_duplicate_sources(db.docstore, duplicates)
+    if isinstance(embedding, CachedEmbeddings):
+        embedding.cache.log_stats()
+
+    if db is None:
+        raise ValueError("❗ No text chunks found after splitting documents.")
+    if checkpoint_db is not None:
+        # The interrupted sync may have embedded part of a file that has been
+        # removed or replaced since; no file lists those chunks any more
+        referenced = referenced_ids(manifest)
+        orphan_ids = [chunk_id for chunk_id in db.index_to_docstore_id.values() if chunk_id not in referenced]
+        if orphan_ids:
+            logger.info("🗑️ Removing %d chunks left by the interrupted sync...", len(orphan_ids))
+            db.delete(orphan_ids)
+
+    version = new_store_version()
+    build_derived_indexes(db, embedding, index_path, model_name, index_type, version)
+    save_faiss_store(db, index_path, model_name, version=version)
+    save_manifest(index_path, manifest)
+    clear_checkpoint(checkpoint_path)
+    logger.info("✅ FAISS index saved (%d vectors).", db.index.ntotal)
+    # Serve from the saved files, not from the build copy
+    return load_faiss_store(index_path, embedding)
+
+def sentence_index_matches(index, db):
+    return index is not None and index.chunk_rows.keys() == set(db.index_to_docstore_id.values())
+
+def bm25_index_matches(index, db):
+    chunk_ids = set(db.index_to_docstore_id.values())
+    return index is not None and len(index) == len(chunk_ids) and set(map(str, index.doc_ids)) == chunk_ids
+
+def create_or_load_sentence_index(db, model, index_path=INDEX_FILE, model_name=MODEL_NAME):
+    index = SentenceIndex.load(index_path, model_name)
+    if sentence_index_matches(index, db):
+        logger.info("💾 Loaded sentence index (%d sentences).", len(index))
+        return index
+
+    # Sorted, so every build of the same chunks lays out the same rows
+    chunk_ids = sorted(set(db.index_to_docstore_id.values()))
+    if index is None:
+        logger.info("🧮 Building sentence index...")
+        chunks = ((doc_id, db.docstore.search(doc_id).page_content) for doc_id in chunk_ids)
+        index = SentenceIndex.build(chunks, model, model_name)
+    else:
+        # Follow the chunks added to / removed from the FAISS index
+        stale = index.chunk_rows.keys() - set(chunk_ids)
+        new = [doc_id for doc_id in chunk_ids if doc_id not in index.chunk_rows]
+        logger.info("🧮 Updating sentence index (-%d / +%d chunks)...", len(stale), len(new))
+        chunks = ((doc_id, db.docstore.search(doc_id).page_content) for doc_id in new)
+        index = index.updated(stale, chunks, model)
+    index.save(index_path)
+    logger.info("✅ Sentence index saved (%d sentences).", len(index))
+    return index
+
+def create_or_load_bm25_index(db, index_path=INDEX_FILE):
+    index = BM25Index.load(index_path)
+    if bm25_index_matches(index, db):
+        logger.info("💾 Loaded BM25 index (%d chunks).", len(index))
+        return index
+
+    # Tokenizing is cheap next to embedding, so chunk changes just rebuild it
+    logger.info("🧮 Building BM25 index...")
+    chunk_ids = sorted(set(db.index_to_docstore_id.values()))
+    index = BM25Index.build((doc_id, db.docstore.search(doc_id).page_content) for doc_id in chunk_ids)
+    index.save(index_path)
+    return BM25Index.load(index_path)
+
+def build_derived_indexes(db, model, index_path=INDEX_FILE, model_name=MODEL_NAME, index_type=INDEX_TYPE,
+                          version=None):
+    """Bring the ANN, sentence and BM25 indexes in ``index_path`` in line with ``db``.
+
+    Returns ``(ann_index, sentence_index, bm25_index)``. Builders call this
+    with the ``version`` they then save ``db`` under, so serving processes
+    only ever have to load these (see load_derived_indexes).
+    """
+    ann_index = load_or_build_ann_index(db.index, index_path, index_type, version)
+    sentence_index = create_or_load_sentence_index(db, model, index_path, model_name)
+    bm25_index = create_or_load_bm25_index(db, index_path) if HYBRID_SEARCH else None
+    return ann_index, sentence_index, bm25_index
+
+def load_derived_indexes(db, index_path=INDEX_FILE, model_name=MODEL_NAME, index_type=INDEX_TYPE, version=None):
+    """Load what build_derived_indexes saved for store ``version`` of ``db``.
+
+    Returns None when one of them is missing or belongs to another version.
+    """
+    ann_index = load_ann_index(db.index, index_path, index_type, version)
+    sentence_index = SentenceIndex.load(index_path, model_name)
+    bm25_index = BM25Index.load(index_path) if HYBRID_SEARCH else None
+    if ann_index is None or not sentence_index_matches(sentence_index, db):
+        return None
+    if HYBRID_SEARCH and not bm25_index_matches(bm25_index, db):
+        return None
+    return ann_index, sentence_index, bm25_index
+
+def year_filters(db):
+    """Group FAISS rows by report year for filtered search."""
+    year_rows = {}
+    for row, chunk_id in db.index_to_docstore_id.items():
+        metadata = db.docstore.search(chunk_id).metadata
+        # A chunk shared by several reports counts for each of their years;
+        # chunks indexed before the year field existed fall back to the file name
+        years = metadata.get("years") or [metadata.get("year") or extract_year(metadata.get("source", ""))]
+        for year in years:
+            if year is not None:
+                year_rows.setdefault(int(year), []).append(row)
+    return {year: np.array(rows, dtype=np.int64) for year, rows in year_rows.items()}
+
+
+class IndexSnapshot:
+    """One version of the served store and everything derived from it.
+
+    A reload builds a new snapshot and swaps it in with one assignment. Each
+    query reads the engine's snapshot once and uses only that object, so it
+    never pairs the FAISS rows of one version with the chunks, sentences or
+    BM25 postings of another.
+    """
+
+    def __init__(self, db, sentence_index, bm25_index, version):
+        self.db = db
+        self.sentence_index = sentence_index
+        self.bm25_index = bm25_index
+        self.version = version
+        self.year_rows = year_filters(db)
+        self._scopes = {}
+
+    def scope(self, min_year):
+        """Return the FAISS selector and BM25 mask for chunks from ``min_year`` on.
+
+        None means no filtering: no year was asked for, or no chunk is from
+        that year or later (the query then searches every report).
+        """
+        if min_year is None:
+            return None
+        if min_year not in self._scopes:
+            rows = [r for year, r in self.year_rows.items() if year >= min_year]
+            scope = None
+            if rows:
+                rows = np.unique(np.concatenate(rows))
+                mask = None
+                if self.bm25_index is not None:
+                    chunk_ids = [self.db.index_to_docstore_id[int(row)] for row in rows]
+                    mask = np.isin(self.bm25_index.doc_ids, chunk_ids)
+                scope = (search_parameters(self.db.index, faiss.IDSelectorBatch(rows)), mask)
+            self._scopes[min_year] = scope
+        return self._scopes[min_year]
+
+class RAGEngine:
+    """Owns the model and indexes behind get_response.
+
+    Nothing is loaded on construction: warm_up() loads the model once, shares
+    it between FAISS query embedding and sentence ranking, and loads (or
+    builds) the indexes. Servers call start_background_warm_up() so they can
+    accept connections immediately and report readiness separately.
+
+    The chunking, ANN index type and k can be set per engine, which is how
+    evaluate.py compares configurations; each chunking needs its own
+    ``index_path``. An already loaded ``model`` can be shared between engines.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, index_path=INDEX_FILE, docs_folder=DOCS_FOLDER,
+                 chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, index_type=INDEX_TYPE, top_k=TOP_K,
+                 model=None):
+        self.model_name = model_name
+        self.index_path = index_path
+        self.docs_folder = docs_folder
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.index_type = index_type
+        self.top_k = top_k
+        self.model = model
+        self.embeddings = None
+        self.snapshot = None
+        self.faq = None
+        self.cache = ResponseCache()
+        self._sparse_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bm25")
+        self.error = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._next_index_check = 0.0
+        self._reloading = False
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    @property
+    def db(self):
+        return self.snapshot.db if self.snapshot is not None else None
+
+    @property
+    def sentence_index(self):
+        return self.snapshot.sentence_index if self.snapshot is not None else None
+
+    def warm_up(self):
+        """Load everything needed to answer queries. Safe to call repeatedly."""
+        if self._ready.is_set():
+            return self
+        with self._lock:
+            if self._ready.is_set():
+                return self
+            ensure_punkt()
+            if self.model is None:
+                logger.info("🧠 Loading embedding model %s...", self.model_name)
+                self.model = get_embedding_provider(self.model_name)
+            # The provider embeds queries, chunks and sentences alike; chunk
+            # vectors also go through the on-disk embedding cache
+            self.embeddings = with_embedding_cache(self.model)
+            db = create_or_load_faiss_index(
+                self.embeddings, self.index_path, self.docs_folder, self.model_name,
+                self.chunk_size, self.chunk_overlap, self.index_type,
+            )
+            # Builds whatever derived index is still missing, e.g. on the first start
+            self._load_indexes(db, index_version(self.index_path), build=True)
+            self.faq = FAQIndex.load(self.model)
+            self.error = None
+            self._ready.set()
+            logger.info("✅ RAG engine ready.")
+        return self
+
+    def start_background_warm_up(self):
+        if self._ready.is_set():
+            return None
+        thread = threading.Thread(target=self._background_warm_up, name="rag-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def configure_worker(self, threads):
+        """Size the thread pools of a worker forked from a warmed-up parent."""
+        self.model.set_threads(threads)
+        faiss.omp_set_num_threads(threads)
+
+    def _background_warm_up(self):
         try:
-            year = int(expected_year)
-            docs = [
-                d for d in docs
-                if any(str(y) in d.metadata.get("source", "") for y in range(year, 2031))
-            ] or docs
-        except:
-            pass
-
-    if not docs:
-        return {"answer": "❗ Sorry, no relevant information found.", "source": None}
-
-    combined_text = " ".join([doc.page_content for doc in docs])
-    sentences = sent_tokenize(combined_text)
-    print(f"📝 Sentences extracted: {len(sentences)}")
-
-    cleaned_sentences = []
-    seen = set()
-    for s in sentences:
-        s = s.strip()
-        if "www." in s.lower() or "http" in s.lower():
-            continue
-        if "@" in s or "Follow us" in s or "Annual Report" in s or "Contents" in s:
-            continue
-        if len(re.sub(r'[^a-zA-Z]', '', s)) < 20:
-            continue
-        if len(s.split()) >= 4 and s not in seen:
-            cleaned_sentences.append(s)
-            seen.add(s)
-
-    if not cleaned_sentences:
-        print("⚠️ Fallback: Using raw chunk content.")
-        fallback = clean_text(sentences[0]) if sentences else ""
-        redirect = "You can find more in the full report at https://www.ziziafrique.org"
-        return {
-            "answer": f"{fallback}\n\n{redirect}".strip(),
-            "source": docs[0].metadata.get("source", "Unknown source")
-        }
-
-    print(f"✅ Clean sentences retained: {len(cleaned_sentences)}")
-
-    sentence_embeddings = sentence_model.encode(cleaned_sentences)
-    query_embedding = sentence_model.encode(query)
-
-    similarities = util.cos_sim(query_embedding, sentence_embeddings)[0]
-    sorted_indices = similarities.argsort(descending=True)
-
-    top_sentences = [clean_sentence(cleaned_sentences[i]) for i in sorted_indices[:3]]
-    final_answer = " ".join(top_sentences).strip()
-    final_answer = clean_text(final_answer)
-
-    metadata = docs[0].metadata
-    source_name = metadata.get("source", "Unknown document").split("\\")[-1]
-    page_number = metadata.get("page", "Unknown page")
-    source_text = f"{source_name} — Page {page_number}"
-
-    print(f"✅ Final answer: {final_answer}")
-    print(f"🔗 Source: {source_text}")
-
-    return {
-        "answer": final_answer or "❗ Sorry, I couldn't find a good answer.",
-        "source": source_text
-    }
-
-
-
+            self.warm_up()
+        except Exception as e:
+            self.error = e
+            logger.exception("❌ RAG engine warm-up failed: %s", e)
+
+    def _load_indexes(self, db, version, build=False):
+        """Serve ``db`` (store ``version``) and the indexes derived from it, swapped in as one snapshot.
+
+        Without ``build`` the derived indexes are only loaded, never written:
+        returns False, keeping the current snapshot, when those of
+        ``version`` are not all on disk.
+        """
+        if build:
+            derived = build_derived_indexes(db, self.model, self.index_path, self.model_name, self.index_type, version)
+        else:
+            derived = load_derived_indexes(db, self.index_path, self.model_name, self.index_type, version)
+            if derived is None:
+                return False
+        ann_index, sentence_index, bm25_index = derived
+        # Search with the configured ANN index; row positions match the flat one
+        db.index = ann_index
+        self.snapshot = IndexSnapshot(db, sentence_index, bm25_index, version)
+        self.cache.set_version(version)
+        return True
+
+    def _check_index(self):
+        """Reload in the background when the index on disk was rebuilt since it was loaded.
+
+        Checked at most every INDEX_CHECK_SECONDS. Queries keep using the
+        loaded index until the new one is ready; the response cache is
+        emptied when it is swapped in. Every worker reloads on its own but
+        only loads: the builder saved the derived indexes before the store.
+        """
+        now = time.monotonic()
+        if not INDEX_CHECK_SECONDS or not self.ready or self._reloading or now < self._next_index_check:
+            return
+        self._next_index_check = now + INDEX_CHECK_SECONDS
+        try:
+            version = index_version(self.index_path)
+        except OSError:
+            # Caught between the files of a save; look again next time
+            return
+        if version != self.snapshot.version:
+            self._reloading = True
+            threading.Thread(target=self._reload, args=(version,), name="rag-reload", daemon=True).start()
+
+    def _reload(self, version):
+        try:
+            with self._lock:
+                logger.info("🔄 Index on disk changed, reloading...")
+                ensure_same_model(read_header(self.index_path).get("model"), self.model_name, self.index_path)
+                db = load_faiss_store(self.index_path, self.embeddings)
+                if not self._load_indexes(db, version):
+                    db.docstore.close()
+                    logger.warning("⏳ Derived indexes of the new index are not saved yet, still serving the previous one.")
+                    return
+                logger.info("✅ Index reloaded (%d vectors).", db.index.ntotal)
+        except Exception as e:
+            logger.exception("❌ Index reload failed, still serving the previous one: %s", e)
+        finally:
+            self._reloading = False
+
+    def search_chunks(self, query_embeddings, k=5, queries=None, min_years=None, snapshot=None):
+        """Return ``(chunk_id, document)`` hits for each row of ``query_embeddings``.
+
+        Queries go to FAISS as one matrix search per year scope; ``min_years``
+        restricts each query to reports from that year on, filtering inside
+        FAISS rather than after retrieval. When ``queries`` are given and
+        hybrid search is on, BM25 runs on a worker thread while FAISS
+        searches, and both rankings are merged with reciprocal rank fusion.
+        ``snapshot`` defaults to the one being served.
+        """
+        index = snapshot or self.snapshot
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+        min_years = min_years or [None] * len(query_embeddings)
+        with stage("filter"):
+            scopes = [index.scope(year) for year in min_years]
+        with stage("retrieve"):
+            hybrid = queries is not None and index.bm25_index is not None
+            candidates = max(k, HYBRID_CANDIDATES) if hybrid else k
+            if hybrid:
+                sparse = self._sparse_pool.submit(lambda: [
+                    index.bm25_index.search(q, candidates, doc_mask=None if scope is None else scope[1])
+                    for q, scope in zip(queries, scopes)
+                ])
+
+            groups = {}
+            for i, scope in enumerate(scopes):
+                groups.setdefault(id(scope), (scope, []))[1].append(i)
+            rankings = [None] * len(query_embeddings)
+            for scope, indices in groups.values():
+                params = None if scope is None else scope[0]
+                _, rows = index.db.index.search(query_embeddings[indices], candidates, params=params)
+                for i, query_rows in zip(indices, rows):
+                    rankings[i] = [index.db.index_to_docstore_id[int(row)] for row in query_rows if row != -1]
+
+            if hybrid:
+                rankings = [
+                    reciprocal_rank_fusion([dense, sparse_ranking], k)
+                    for dense, sparse_ranking in zip(rankings, sparse.result())
+                ]
+
+            return [
+                [(chunk_id, index.db.docstore.search(chunk_id)) for chunk_id in ranking[:k]]
+                for ranking in rankings
+            ]
+
+    def get_response(self, query: str) -> dict:
+        return self.get_responses([query])[0]
+
+    def get_responses(self, queries: list[str], use_cache: bool = True, deadlines=None) -> list[dict]:
+        """Answer several queries with one encode call and one FAISS search.
+
+        Bulk callers pass ``use_cache=False`` so a backlog of one-off
+        questions neither reads nor evicts the response cache. ``deadlines``
+        are time.monotonic() times by which each answer is due; a query
+        running out of time gets a degraded answer, which is not cached.
+        """
+        deadlines = deadlines or [None] * len(queries)
+        responses, to_search = self._lookup(queries, use_cache)
+        if not to_search:
+            return responses
+
+        # One snapshot for the whole batch, even if a reload swaps it meanwhile
+        snapshot = self.snapshot
+        all_hits = self._search(snapshot, [queries[i] for i, _ in to_search], [e for _, e in to_search])
+        for (i, query_embedding), hits in zip(to_search, all_hits):
+            response = self._build_response(snapshot, queries[i], query_embedding, hits, deadlines[i])
+            if use_cache and not response.get("degraded"):
+                self.cache.put(
+                    queries[i], response, query_embedding, scope=detect_expected_year(queries[i]),
+                    version=snapshot.version,
+                )
+            responses[i] = response
+        return responses
+
+    def stream_response(self, query: str, deadline=None):
+        """Answer ``query`` one stage at a time, for streaming to the client.
+
+        Yields ``("source", text)`` as soon as retrieval is done, then
+        ``("sentence", text)`` for each answer sentence in rank order, and
+        finally ``("done", response)`` with what get_response would return.
+        Closing the generator between two events skips the remaining stages.
+        ``deadline`` is as for get_responses.
+        """
+        responses, to_search = self._lookup([query])
+        if not to_search:
+            response = responses[0]
+            yield "source", response["source"]
+            yield "sentence", response["answer"]
+            yield "done", response
+            return
+
+        _, query_embedding = to_search[0]
+        snapshot = self.snapshot
+        hits = self._search(snapshot, [query], [query_embedding])[0]
+        for event, value in self._answer_events(snapshot, query, query_embedding, hits, deadline):
+            if event == "done" and not value.get("degraded"):
+                self.cache.put(
+                    query, value, query_embedding, scope=detect_expected_year(query), version=snapshot.version
+                )
+            yield event, value
+
+    def _lookup(self, queries, use_cache=True):
+        """Answer what the cache can; return the responses so far and ``(i, embedding)`` to search."""
+        self._check_index()
+        QUERIES.inc(len(queries))
+        for query in queries:
+            logger.debug("🔎 Received query: %s", query)
+
+        responses = [None] * len(queries)
+        pending = []
+        for i, query in enumerate(queries):
+            if not query.strip():
+                responses[i] = {"answer": "❗ Please enter a valid query.", "source": None}
+                continue
+            # Known questions are answered before the cache and retrieval
+            faq = self.faq.get(query) if self.faq is not None else None
+            if faq is not None:
+                FAQ_HITS.inc(match="exact")
+                responses[i] = faq
+                continue
+            cached = self.cache.get(query) if use_cache else None
+            if cached is not None:
+                logger.debug("⚡ Cache hit.")
+                CACHE_HITS.inc(tier="exact")
+                responses[i] = cached
+            else:
+                pending.append(i)
+        if not pending:
+            return responses, []
+
+        self.warm_up()
+        with stage("encode"):
+            query_embeddings = self.model.encode(
+                [queries[i] for i in pending], normalize_embeddings=True, convert_to_numpy=True
+            )
+
+        # Near-duplicates of cached queries are answered without retrieval
+        to_search = []
+        for i, query_embedding in zip(pending, query_embeddings):
+            scope = detect_expected_year(queries[i])
+            # FAQs have no year, so a question about one always goes to retrieval
+            faq = self.faq.get_similar(query_embedding) if scope is None else None
+            if faq is not None:
+                FAQ_HITS.inc(match="semantic")
+                responses[i] = faq
+                continue
+            cached = self.cache.get_similar(query_embedding, scope=scope) if use_cache else None
+            if cached is not None:
+                logger.debug("⚡ Semantic cache hit.")
+                CACHE_HITS.inc(tier="semantic")
+                responses[i] = cached
+            else:
+                to_search.append((i, query_embedding))
+        if to_search and use_cache:
+            self.cache.record_miss(len(to_search))
+        CACHE_MISSES.inc(len(to_search))
+        return responses, to_search
+
+    def _search(self, snapshot, queries, query_embeddings):
+        min_years = [
+            int(year) if (year := detect_expected_year(q)) else None for q in queries
+        ]
+        return self.search_chunks(
+            np.stack(query_embeddings), k=self.top_k, queries=queries, min_years=min_years, snapshot=snapshot
+        )
 
+    def _build_response(self, snapshot, query, query_embedding, hits, deadline=None) -> dict:
+        for event, value in self._answer_events(snapshot, query, query_embedding, hits, deadline):
+            if event == "done":
+                return value
+
+    def _answer_events(self, snapshot, query, query_embedding, hits, deadline=None):
+        """The answer to ``query`` from ``hits``, as the events of stream_response()."""
+        logger.debug("📄 Chunks retrieved: %d", len(hits))
+
+        if not hits:
+            EMPTY_RESULTS.inc()
+            yield "done", {"answer": "❗ Sorry, no relevant information found.", "source": None}
+            return
+
+        docs = [d for _, d in hits]
+        # Collapsed duplicates cite the newest report that has the chunk
+        metadata = (docs[0].metadata.get("sources") or [docs[0].metadata])[0]
+        source_name = metadata.get("source", "Unknown document").split("\\")[-1]
+        page_number = metadata.get("page", "Unknown page")
+        source_text = f"{source_name} — Page {page_number}"
+        yield "source", source_text
+
+        degraded = deadline is not None and time.monotonic() > deadline - RANK_RESERVE_MS / 1000
+        if degraded:
+            logger.info("⏱️ Deadline close: skipping re-ranking.")
+            DEGRADED.inc()
+            top_sentences = snapshot.sentence_index.chunk_sentences(hits[0][0])
+        else:
+            with stage("rank"):
+                top_sentences = snapshot.sentence_index.top_sentences(query_embedding, [chunk_id for chunk_id, _ in hits])
+
+        if not top_sentences:
+            logger.info("⚠️ Fallback: Using raw chunk content.")
+            FALLBACKS.inc()
+            fallback = snapshot.sentence_index.fallback_sentence(hits[0][0])
+            redirect = "You can find more in the full report at https://www.ziziafrique.org"
+            answer = f"{fallback}\n\n{redirect}".strip()
+            yield "sentence", answer
+            yield "done", self._with_degraded({
+                "answer": answer,
+                "source": metadata.get("source", "Unknown source")
+            }, degraded)
+            return
+
+        for sentence in top_sentences:
+            yield "sentence", sentence
+
+        # Sentences are stored cleaned, so joining them is all that is left
+        with stage("postprocess"):
+            final_answer = " ".join(top_sentences)
+
+        logger.debug("✅ Final answer: %s", final_answer)
+        logger.debug("🔗 Source: %s", source_text)
+
+        yield "done", self._with_degraded({
+            "answer": final_answer or "❗ Sorry, I couldn't find a good answer.",
+            "source": source_text
+        }, degraded)
+
+    @staticmethod
+    def _with_degraded(response, degraded):
+        # Only degraded answers carry the flag, so callers can tell them apart
+        if degraded:
+            response["degraded"] = True
+        return response
+
+engine = RAGEngine()
 
+def get_response(query: str) -> dict:
+    return engine.get_response(query)
 
+_ENGINE_ATTRIBUTES = {"db": "db", "sentence_model": "model", "sentence_index": "sentence_index"}
 
+def __getattr__(name):
+    # Keeps `from rag import db` working for scripts; loads the engine on first use.
+    if name in _ENGINE_ATTRIBUTES:
+        return getattr(engine.warm_up(), _ENGINE_ATTRIBUTES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,152 @@
+import json
+import os
+import numpy as np
+from nltk.tokenize import sent_tokenize
+from atomic_files import replacing
+from dedup import Deduplicator
+from text_cleaning import clean_sentence, clean_text, is_answer_sentence
+
+SENTENCES_FILE = "sentences.json"
+EMBEDDINGS_FILE = "sentence_embeddings.npy"
+# Bumped when the stored sentences change meaning; older indexes are rebuilt
+FORMAT_VERSION = 3
+
+
+class SentenceIndex:
+    """Answer sentences of every chunk together with their embeddings.
+
+    Sentences are tokenized, filtered and cleaned once at ingest time and
+    their normalized embeddings are stored as a float32 matrix. Only the
+    sentences that pass is_answer_sentence are kept, already in their final
+    display form, and each chunk also stores the sentence the answer falls
+    back to when none of its sentences pass. A sentence repeated across
+    chunks (chunk overlap, boilerplate shared by several reports) is stored
+    and embedded once: each chunk lists the rows of its sentences, so the
+    chunks returned by FAISS map straight onto rows of the matrix and
+    answering a query only needs the query embedding, a dot product and
+    lookups.
+    """
+
+    def __init__(self, sentences, chunk_rows, embeddings, model_name, fallbacks=None):
+        self.sentences = sentences
+        self.chunk_rows = chunk_rows
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.fallbacks = fallbacks or {}
+
+    def __len__(self):
+        return len(self.sentences)
+
+    @classmethod
+    def build(cls, chunks, model, model_name, batch_size=64):
+        """Build the index from ``(chunk_id, text)`` pairs."""
+        empty = np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+        return cls([], {}, empty, model_name).updated((), chunks, model, batch_size)
+
+    def updated(self, removed_chunk_ids, added_chunks, model, batch_size=64):
+        """Return a new index without ``removed_chunk_ids`` and with ``added_chunks``.
+
+        Only the sentences of the added chunks that are not already stored
+        are encoded; surviving rows are copied over.
+        """
+        removed = set(removed_chunk_ids)
+        kept = {c: rows for c, rows in self.chunk_rows.items() if c not in removed}
+        old_rows = self.rows_for(kept)
+        renumbered = {int(old): new for new, old in enumerate(old_rows)}
+        sentences = [self.sentences[i] for i in old_rows]
+        chunk_rows = {c: [renumbered[r] for r in rows] for c, rows in kept.items()}
+        fallbacks = {c: self.fallbacks[c] for c in kept if c in self.fallbacks}
+
+        deduplicator = Deduplicator()
+        for row, sentence in enumerate(sentences):
+            deduplicator.add(sentence, row)
+        new_sentences = []
+        for chunk_id, text in added_chunks:
+            tokenized = sent_tokenize(text)
+            fallbacks[chunk_id] = clean_text(tokenized[0]) if tokenized else ""
+            rows = []
+            for s in tokenized:
+                s = s.strip()
+                if not is_answer_sentence(s):
+                    continue
+                # clean_text per sentence equals clean_text of the joined answer
+                sentence = clean_text(clean_sentence(s))
+                row = deduplicator.add(sentence, len(sentences))
+                if row is None:
+                    row = len(sentences)
+                    sentences.append(sentence)
+                    new_sentences.append(s)
+                if row not in rows:
+                    rows.append(row)
+            chunk_rows[chunk_id] = rows
+
+        embeddings = np.asarray(self.embeddings[old_rows], dtype=np.float32)
+        if new_sentences:
+            added = model.encode(new_sentences, batch_size=batch_size, normalize_embeddings=True, convert_to_numpy=True)
+            embeddings = np.concatenate([embeddings, np.asarray(added, dtype=np.float32)])
+        return SentenceIndex(sentences, chunk_rows, embeddings, self.model_name, fallbacks)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        # Write to temporary files and swap them in: the previous embeddings
+        # may still be memory-mapped by this or another process.
+        with replacing(os.path.join(path, EMBEDDINGS_FILE), os.path.join(path, SENTENCES_FILE)) as (
+            embeddings_path, sentences_path
+        ):
+            with open(embeddings_path, "wb") as f:
+                np.save(f, np.asarray(self.embeddings))
+            with open(sentences_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "format_version": FORMAT_VERSION,
+                    "model": self.model_name,
+                    "sentences": self.sentences,
+                    "chunks": self.chunk_rows,
+                    "fallbacks": self.fallbacks,
+                }, f)
+
+    @classmethod
+    def load(cls, path, model_name):
+        """Load a saved index with the embeddings memory-mapped.
+
+        Returns None when the index is missing, in an older format, was
+        built with another model, or when the sentences and the embeddings
+        come from different saves.
+        """
+        sentences_path = os.path.join(path, SENTENCES_FILE)
+        embeddings_path = os.path.join(path, EMBEDDINGS_FILE)
+        if not (os.path.exists(sentences_path) and os.path.exists(embeddings_path)):
+            return None
+
+        with open(sentences_path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format_version") != FORMAT_VERSION or data.get("model") != model_name:
+            return None
+
+        embeddings = np.load(embeddings_path, mmap_mode="r")
+        if len(data["sentences"]) != embeddings.shape[0]:
+            return None
+        return cls(data["sentences"], data["chunks"], embeddings, model_name, data["fallbacks"])
+
+    def rows_for(self, chunk_ids):
+        """Sorted distinct rows of the sentences of ``chunk_ids``."""
+        rows = [row for c in chunk_ids for row in self.chunk_rows.get(c, ())]
+        return np.unique(np.array(rows, dtype=np.int64))
+
+    def chunk_sentences(self, chunk_id, n=3):
+        """The first ``n`` answer sentences of ``chunk_id``, in text order, without ranking."""
+        return [self.sentences[row] for row in self.chunk_rows.get(chunk_id, ())[:n]]
+
+    def fallback_sentence(self, chunk_id):
+        return self.fallbacks.get(chunk_id, "")
+
+    def top_sentences(self, query_embedding, chunk_ids, n=3):
+        """Return the ``n`` sentences of ``chunk_ids`` closest to the query.
+
+        Rows are distinct sentences, so no further deduplication is needed.
+        """
+        rows = self.rows_for(chunk_ids)
+        if not len(rows):
+            return []
+
+        scores = self.embeddings[rows] @ np.asarray(query_embedding, dtype=np.float32)
+        return [self.sentences[rows[i]] for i in np.argsort(-scores, kind="stable")[:n]]
@@ -0,0 +1,112 @@
+import argparse
+import gc
+import logging
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+logger = logging.getLogger("serve")
+
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", "0")) or os.cpu_count() or 1
+# Intra-op threads per worker; by default the cores are split between workers
+SERVE_THREADS = int(os.getenv("SERVE_THREADS", "0"))
+
+def run_worker(sock, threads, log_level):
+    """Serve main.app on the inherited socket in a forked child."""
+    import uvicorn
+    import main
+
+    main.engine.configure_worker(threads)
+    config = uvicorn.Config(main.app, log_level=log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+def main():
+    parser = argparse.ArgumentParser(description="Load the RAG engine once and fork workers that share it.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    parser.add_argument("--threads", type=int, default=SERVE_THREADS, help="Intra-op threads per worker")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+
+    # The parent must not start OpenMP / ONNX Runtime thread pools: they do
+    # not survive fork. Workers size their own pools in configure_worker().
+    os.environ["OMP_NUM_THREADS"] = "1"
+    os.environ["EMBED_THREADS"] = "1"
+    # Workers write their metrics to files in one directory, summed by
+    # whichever worker answers /metrics; counting starts over with the server
+    metrics_dir = os.environ.get("RAG_METRICS_DIR")
+    own_metrics_dir = not metrics_dir
+    if own_metrics_dir:
+        metrics_dir = os.environ["RAG_METRICS_DIR"] = tempfile.mkdtemp(prefix="rag-metrics-")
+    for filename in os.listdir(metrics_dir):
+        if filename.endswith(".metrics"):
+            os.remove(os.path.join(metrics_dir, filename))
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    import main as app_module
+
+    started = time.perf_counter()
+    app_module.engine.warm_up()
+    logger.info("🧠 Engine loaded in %.1fs; forking %d workers with %d threads each",
+                time.perf_counter() - started, args.workers, threads)
+    # Keep the collector from touching (and so copying) the shared objects
+    gc.collect()
+    gc.freeze()
+
+    sock = socket.socket(socket.AF_INET6 if ":" in args.host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                run_worker(sock, threads, args.log_level)
+            finally:
+                os._exit(0)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(args.workers):
+        spawn()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            logger.warning("⚠️ Worker %d exited with status %d, restarting", pid, os.waitstatus_to_exitcode(status))
+            spawn()
+    sock.close()
+    if own_metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+import abc
+import os
+
+
+class ProcessLocalConnection(abc.ABC):
+    """Mixin giving a SQLite store one connection per process.
+
+    ``conn`` calls the class's ``_connect()`` on first use in each process,
+    so a store created before the server forks its workers is still usable
+    in every one of them; a connection inherited across fork is never used.
+    """
+
+    _conn = None
+    _pid = None
+
+    @property
+    def conn(self):
+        if self._pid != os.getpid():
+            self._conn = self._connect()
+            self._pid = os.getpid()
+        return self._conn
+
+    @abc.abstractmethod
+    def _connect(self):
+        """Open the store's SQLite connection."""
+
+    def _close_connection(self):
+        # Only the process that opened the connection may close it
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+        self._pid = None
@@ -0,0 +1,71 @@
+import asyncio
+import time
+import pytest
+from admission import AdmissionController, Overloaded, run_to_completion
+
+def test_full_queue_is_shed_straight_away():
+    async def run():
+        admission = AdmissionController(max_in_flight=1, max_queued=1)
+        deadline = time.monotonic() + 5
+        release = await admission.acquire(deadline)
+        waiting = asyncio.create_task(admission.acquire(deadline))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as shed:
+            await admission.acquire(deadline)
+        release()
+        (await waiting)()
+        return shed.value.reason
+
+    assert asyncio.run(run()) == "queue_full"
+
+def test_waiting_past_the_deadline_is_shed():
+    async def run():
+        admission = AdmissionController(max_in_flight=1, max_queued=4)
+        release = await admission.acquire(time.monotonic() + 5)
+        with pytest.raises(Overloaded) as shed:
+            await admission.acquire(time.monotonic() + 0.02)
+        assert admission.queued == 0
+        release()
+        return shed.value.reason
+
+    assert asyncio.run(run()) == "deadline"
+
+def test_releasing_twice_frees_one_slot():
+    async def run():
+        admission = AdmissionController(max_in_flight=1, max_queued=0)
+        release = await admission.acquire(time.monotonic() + 5)
+        release()
+        release()
+        second = await admission.acquire(time.monotonic() + 5)
+        # Only one slot exists: a third request finds it taken and no room to queue
+        with pytest.raises(Overloaded):
+            await admission.acquire(time.monotonic() + 5)
+        second()
+
+    asyncio.run(run())
+
+def test_cancelled_request_waits_for_its_thread():
+    finished = []
+
+    def stage():
+        time.sleep(0.1)
+        finished.append(True)
+
+    async def run():
+        task = asyncio.create_task(run_to_completion(stage))
+        await asyncio.sleep(0.02)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return finished
+
+    assert asyncio.run(run()) == [True]
+
+def test_overloaded_is_a_503_with_retry_after():
+    pytest.importorskip("fastapi")
+    from main import overloaded_handler
+    from admission import RETRY_AFTER_SECONDS
+
+    response = asyncio.run(overloaded_handler(None, Overloaded("queue_full")))
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(RETRY_AFTER_SECONDS)
@@ -0,0 +1,69 @@
+import asyncio
+from batching import MicroBatcher
+
+def test_concurrent_submits_share_one_batch():
+    batches = []
+
+    def double(items):
+        batches.append(list(items))
+        return [item * 2 for item in items]
+
+    async def run():
+        batcher = MicroBatcher(double, max_batch_size=8, max_wait_ms=50)
+        await batcher.start()
+        try:
+            return await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+        finally:
+            await batcher.stop()
+
+    assert asyncio.run(run()) == [0, 2, 4, 6, 8]
+    assert batches == [[0, 1, 2, 3, 4]]
+
+def test_partial_batch_is_flushed_after_max_wait():
+    async def run():
+        batcher = MicroBatcher(lambda items: items, max_batch_size=64, max_wait_ms=10)
+        await batcher.start()
+        try:
+            return await asyncio.wait_for(batcher.submit("alone"), timeout=1)
+        finally:
+            await batcher.stop()
+
+    assert asyncio.run(run()) == "alone"
+
+def test_full_batch_does_not_wait():
+    batches = []
+
+    def record(items):
+        batches.append(len(items))
+        return items
+
+    async def run():
+        batcher = MicroBatcher(record, max_batch_size=2, max_wait_ms=10_000)
+        await batcher.start()
+        try:
+            return await asyncio.wait_for(asyncio.gather(*(batcher.submit(i) for i in range(4))), timeout=1)
+        finally:
+            await batcher.stop()
+
+    assert asyncio.run(run()) == [0, 1, 2, 3]
+    assert batches == [2, 2]
+
+def test_exceptions_reach_only_their_callers():
+    def answer(items):
+        return [ValueError(item) if item == "bad" else item.upper() for item in items]
+
+    def fail(items):
+        raise RuntimeError("model crashed")
+
+    async def run(process_batch, items):
+        batcher = MicroBatcher(process_batch, max_batch_size=8, max_wait_ms=20)
+        await batcher.start()
+        try:
+            return await asyncio.gather(*(batcher.submit(i) for i in items), return_exceptions=True)
+        finally:
+            await batcher.stop()
+
+    ok, bad = asyncio.run(run(answer, ["ok", "bad"]))
+    assert ok == "OK" and isinstance(bad, ValueError)
+    results = asyncio.run(run(fail, ["a", "b"]))
+    assert all(isinstance(r, RuntimeError) for r in results)
@@ -0,0 +1,29 @@
+import numpy as np
+from bm25_index import BM25Index, reciprocal_rank_fusion
+
+CHUNKS = [
+    ("tvet", "Kenya has 2,313 TVET institutions across 47 counties."),
+    ("courses", "The top courses are tailoring, masonry and carpentry."),
+    ("fees", "Many youth left school because of school fees."),
+]
+
+def test_search_ranks_matching_chunks():
+    index = BM25Index.build(CHUNKS)
+    assert index.search("Which TVET institutions exist?", k=2) == ["tvet"]
+    assert index.search("school fees", k=3)[0] == "fees"
+    assert index.search("unrelated words") == []
+
+def test_search_respects_doc_mask_and_survives_save(tmp_path):
+    BM25Index.build(CHUNKS).save(tmp_path)
+    index = BM25Index.load(tmp_path)
+    assert index.search("2,313 institutions") == ["tvet"]
+    assert index.search("2,313 institutions", doc_mask=np.array([False, True, True])) == []
+
+def test_reciprocal_rank_fusion_prefers_ids_ranked_by_both():
+    assert reciprocal_rank_fusion([["a", "b"], ["b", "c"]], k=2) == ["b", "a"]
+
+def test_arrays_from_different_saves_are_not_loaded(tmp_path):
+    BM25Index.build(CHUNKS).save(tmp_path)
+    BM25Index.build(CHUNKS[:1]).save(tmp_path / "other")
+    (tmp_path / "other" / "bm25" / "doc_ids.npy").replace(tmp_path / "bm25" / "doc_ids.npy")
+    assert BM25Index.load(tmp_path) is None
@@ -0,0 +1,55 @@
+import numpy as np
+from cache import ResponseCache
+
+ANSWER = {"answer": "2,313 institutions.", "source": "report.pdf — Page 3"}
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+def test_exact_hit_ignores_case_spacing_and_trailing_punctuation():
+    cache = ResponseCache(max_size=4, semantic_threshold=None)
+    cache.put("How many TVET institutions?", ANSWER)
+    assert cache.get("  how many   TVET institutions ") == ANSWER
+    assert cache.get("How many universities?") is None
+
+def test_semantic_hit_needs_the_threshold_and_the_same_scope():
+    cache = ResponseCache(max_size=4, semantic_threshold=0.95)
+    cache.put("goals for 2023", ANSWER, unit(1, 0, 0), scope="2023")
+    assert cache.get_similar(unit(1, 0.1, 0), scope="2023") == ANSWER
+    assert cache.get_similar(unit(1, 1, 0), scope="2023") is None
+    assert cache.get_similar(unit(1, 0.1, 0), scope="2022") is None
+    assert cache.stats()["semantic_hits"] == 1
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_size=2, semantic_threshold=None)
+    cache.put("a", ANSWER)
+    cache.put("b", ANSWER)
+    cache.get("a")
+    cache.put("c", ANSWER)
+    assert cache.get("b") is None
+    assert cache.get("a") == ANSWER
+
+def test_expired_entries_are_not_served():
+    cache = ResponseCache(max_size=2, ttl_seconds=-1, semantic_threshold=0.95)
+    cache.put("a", ANSWER, unit(1, 0))
+    assert cache.get("a") is None
+    assert cache.get_similar(unit(1, 0)) is None
+
+def test_new_index_version_empties_the_cache():
+    cache = ResponseCache(max_size=2, semantic_threshold=0.95)
+    cache.set_version(1.0)
+    cache.put("a", ANSWER, unit(1, 0))
+    cache.set_version(1.0)
+    assert cache.get("a") == ANSWER
+    cache.set_version(2.0)
+    assert cache.get("a") is None
+    assert cache.get_similar(unit(1, 0)) is None
+
+def test_answers_of_a_replaced_index_version_are_not_cached():
+    cache = ResponseCache(max_size=2, semantic_threshold=None)
+    cache.set_version(2.0)
+    cache.put("a", ANSWER, version=1.0)
+    assert cache.get("a") is None
+    cache.put("a", ANSWER, version=2.0)
+    assert cache.get("a") == ANSWER
@@ -0,0 +1,31 @@
+from langchain_core.documents import Document
+from dedup import Deduplicator, merge_references, unique_chunks
+
+BOILERPLATE = (
+    "Zizi Afrique Foundation works with partners across Kenya to improve learning outcomes "
+    "for children and youth in technical and vocational training institutions"
+)
+
+def test_exact_duplicates_ignore_case_and_punctuation():
+    deduplicator = Deduplicator(max_distance="")
+    assert deduplicator.add(BOILERPLATE, "a") is None
+    assert deduplicator.add(BOILERPLATE.upper() + ".", "b") == "a"
+    assert deduplicator.add("Something else entirely.", "c") is None
+
+def test_near_duplicates_collapse_unless_numbers_differ():
+    deduplicator = Deduplicator(max_distance=3)
+    assert deduplicator.add(BOILERPLATE + " in 2023", "a") is None
+    assert deduplicator.add(BOILERPLATE + " in 2023 and beyond", "b") == "a"
+    assert deduplicator.add(BOILERPLATE + " in 2024", "c") is None
+
+def test_unique_chunks_records_every_copy():
+    chunks = [
+        ("a", Document(page_content=BOILERPLATE, metadata={"source": "docs/r2021.pdf", "page": 1, "year": 2021})),
+        ("b", Document(page_content=BOILERPLATE, metadata={"source": "docs/r2023.pdf", "page": 2, "year": 2023})),
+    ]
+    duplicates = {}
+    assert [chunk_id for chunk_id, _ in unique_chunks(chunks, duplicates=duplicates)] == ["a"]
+    metadata = merge_references(chunks[0][1].metadata, duplicates["a"])
+    assert metadata["years"] == [2021, 2023]
+    # The newest report is cited first
+    assert [s["source"] for s in metadata["sources"]] == ["docs/r2023.pdf", "docs/r2021.pdf"]
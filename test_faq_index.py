@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from faq_index import FAQIndex
+
+QUESTIONS = ["What is Zizi Afrique?", "How do I apply for a TVET course?"]
+ANSWERS = ["A foundation working on learning outcomes.", "Apply through KUCCPS."]
+
+
+class KeywordModel:
+    """Embeds a text as which of a few words it contains, normalized."""
+
+    WORDS = ("zizi", "apply", "tvet", "goals")
+
+    def encode(self, texts, normalize_embeddings=True, convert_to_numpy=True, **kwargs):
+        single = isinstance(texts, str)
+        vectors = np.array(
+            [[float(w in t.lower()) for w in self.WORDS] for t in ([texts] if single else texts)], dtype=np.float32
+        ) + 0.01
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors[0] if single else vectors
+
+    def get_sentence_embedding_dimension(self):
+        return len(self.WORDS)
+
+def faq_index(threshold="0.92"):
+    model = KeywordModel()
+    return FAQIndex(QUESTIONS, ANSWERS, model.encode(QUESTIONS), threshold)
+
+def test_exact_match_ignores_case_spacing_and_punctuation():
+    faq = faq_index()
+    assert faq.get("  what is ZIZI afrique ") == {"answer": ANSWERS[0], "source": None}
+    assert faq.get("What is Zizi Afrique doing?") is None
+
+def test_paraphrase_needs_the_threshold():
+    model = KeywordModel()
+    assert faq_index().get_similar(model.encode("Tell me about Zizi"))["answer"] == ANSWERS[0]
+    assert faq_index().get_similar(model.encode("goals for the region")) is None
+    assert faq_index(threshold="").get_similar(model.encode("Tell me about Zizi")) is None
+
+def test_load_without_a_file_is_empty(tmp_path):
+    faq = FAQIndex.load(KeywordModel(), str(tmp_path / "missing.json"))
+    assert len(faq) == 0
+    assert faq.get_similar(KeywordModel().encode("zizi")) is None
+
+def test_questions_naming_a_year_skip_the_semantic_faq():
+    pytest.importorskip("nltk")
+    from rag import RAGEngine
+
+    model = KeywordModel()
+    engine = RAGEngine(model=model, index_path="missing-index")
+    engine.faq = faq_index()
+    engine._ready.set()
+    responses, to_search = engine._lookup(["Tell me about Zizi", "Zizi goals for 2023"], use_cache=False)
+    assert responses[0]["answer"] == ANSWERS[0]
+    assert responses[1] is None and [i for i, _ in to_search] == [1]
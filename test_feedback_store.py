@@ -0,0 +1,46 @@
+import asyncio
+import time
+from feedback_store import FeedbackStore, FeedbackWriter
+
+def feedback(source, thumbs="thumbs_up"):
+    return {"query": "q", "answer": "a", "source": source, "feedback": thumbs}
+
+def test_stop_flushes_buffered_feedback(tmp_path):
+    store = FeedbackStore(str(tmp_path / "feedback.sqlite"))
+
+    async def run():
+        writer = FeedbackWriter(store, flush_size=100, flush_seconds=60)
+        await writer.start()
+        writer.submit(feedback("a.pdf"))
+        writer.submit(feedback("a.pdf", "thumbs_down"))
+        await writer.stop()
+
+    asyncio.run(run())
+    assert store.summary_by_source() == [{"source": "a.pdf", "thumbs_up": 1, "thumbs_down": 1, "total": 2}]
+
+def test_stop_during_a_failing_flush_keeps_that_batch(tmp_path):
+    store = FeedbackStore(str(tmp_path / "feedback.sqlite"))
+    write_many = store.write_many
+    calls = []
+
+    def slow_write_many(events):
+        calls.append(len(events))
+        first = len(calls) == 1
+        time.sleep(0.2)
+        if first:
+            raise OSError("disk busy")
+        write_many(events)
+
+    store.write_many = slow_write_many
+
+    async def run():
+        writer = FeedbackWriter(store, flush_size=2, flush_seconds=60)
+        await writer.start()
+        writer.submit(feedback("a.pdf"))
+        writer.submit(feedback("a.pdf"))
+        await asyncio.sleep(0.05)
+        writer.submit(feedback("b.pdf"))
+        await writer.stop()
+
+    asyncio.run(run())
+    assert {row["source"]: row["total"] for row in store.summary_by_source()} == {"a.pdf": 2, "b.pdf": 1}
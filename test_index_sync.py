@@ -0,0 +1,191 @@
+import hashlib
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from index_builder import add_chunks_streaming, checkpoint_path_for, load_checkpoint, save_checkpoint, stage_store
+from index_manifest import diff_manifest, load_manifest, manifest_from_docstore, referenced_ids, remove_files
+from index_store import load_faiss_store, new_store_version, save_faiss_store
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic 8-dimensional vectors, so no model is needed."""
+
+    model_name = "hash"
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "big")
+        return np.random.default_rng(seed).random(8, dtype=np.float32).tolist()
+
+    def encode(self, texts, **kwargs):
+        return np.array(self.embed_documents(texts), dtype=np.float32).reshape(len(texts), 8)
+
+    def get_sentence_embedding_dimension(self):
+        return 8
+
+def chunk(text, source, page=0):
+    return Document(page_content=text, metadata={"source": source, "page": page})
+
+def test_diff_manifest_finds_new_modified_and_deleted_files():
+    manifest = {
+        "same.pdf": {"sha256": "a", "chunk_ids": ["s1"]},
+        "edited.pdf": {"sha256": "b", "chunk_ids": ["e1"]},
+        "deleted.pdf": {"sha256": "c", "chunk_ids": ["d1"]},
+    }
+    added, removed = diff_manifest(manifest, {"same.pdf": "a", "edited.pdf": "b2", "new.pdf": "n"})
+    assert sorted(added) == ["edited.pdf", "new.pdf"]
+    assert sorted(removed) == ["deleted.pdf", "edited.pdf"]
+
+def test_manifest_from_docstore_adopts_legacy_index():
+    db = add_chunks_streaming(None, [
+        ("a1", chunk("first", "docs\\a.pdf")),
+        ("a2", chunk("second", "docs\\a.pdf", 1)),
+        ("b1", chunk("third", "docs/b.pdf")),
+    ], HashEmbeddings())
+    manifest = manifest_from_docstore(db, {"a.pdf": "ha", "b.pdf": "hb"})
+    assert manifest == {
+        "a.pdf": {"sha256": "ha", "chunk_ids": ["a1", "a2"]},
+        "b.pdf": {"sha256": "hb", "chunk_ids": ["b1"]},
+    }
+    assert diff_manifest(manifest, {"a.pdf": "ha", "b.pdf": "hb"}) == ([], [])
+
+def test_remove_files_keeps_chunks_another_file_references():
+    manifest = {
+        "old.pdf": {"sha256": "o", "chunk_ids": ["own", "boilerplate"]},
+        "new.pdf": {"sha256": "n", "chunk_ids": ["boilerplate", "fresh"]},
+    }
+    stale_ids, shared_ids = remove_files(manifest, ["old.pdf"])
+    assert stale_ids == {"own"}
+    assert shared_ids == {"boilerplate"}
+    assert list(manifest) == ["new.pdf"]
+
+def test_interrupted_build_resumes_from_checkpoint(tmp_path):
+    checkpoint_path = str(tmp_path / "index.partial")
+    chunks = [(f"c{i}", chunk(f"chunk number {i}", "a.pdf", i)) for i in range(7)]
+
+    def interrupted():
+        yield from chunks[:5]
+        raise KeyboardInterrupt
+
+    try:
+        add_chunks_streaming(None, interrupted(), HashEmbeddings(), checkpoint_path, batch_size=2, checkpoint_every=1)
+    except KeyboardInterrupt:
+        pass
+    db, done_ids = load_checkpoint(checkpoint_path, HashEmbeddings())
+    assert done_ids == {"c0", "c1", "c2", "c3"}
+
+    embedded = []
+
+    class CountingEmbeddings(HashEmbeddings):
+        def embed_documents(self, texts):
+            embedded.extend(texts)
+            return super().embed_documents(texts)
+
+    db = add_chunks_streaming(db, iter(chunks), CountingEmbeddings(), checkpoint_path, done_ids, batch_size=2)
+    assert embedded == ["chunk number 4", "chunk number 5", "chunk number 6"]
+    assert sorted(db.index_to_docstore_id.values()) == [f"c{i}" for i in range(7)]
+    assert db.index.ntotal == 7
+
+def test_reload_only_swaps_in_once_the_derived_indexes_are_saved(tmp_path):
+    pytest.importorskip("nltk")
+    from rag import RAGEngine, build_derived_indexes, index_version
+
+    index_path = str(tmp_path / "index")
+    embeddings = HashEmbeddings()
+
+    def save(texts, with_derived=True):
+        db = add_chunks_streaming(None, [(f"c{i}", chunk(text, "2023 report.pdf", i)) for i, text in enumerate(texts)],
+                                  embeddings)
+        version = new_store_version()
+        if with_derived:
+            build_derived_indexes(db, embeddings, index_path, "hash", "flat", version)
+        save_faiss_store(db, index_path, "hash", version=version)
+        return version
+
+    first = save(["Kenya has 2,313 TVET institutions."])
+    engine = RAGEngine(model_name="hash", index_path=index_path, index_type="flat", model=embeddings)
+    engine.embeddings = embeddings
+    engine._load_indexes(load_faiss_store(index_path, embeddings), index_version(index_path), build=True)
+    assert engine.snapshot.version == first
+
+    # A store saved without its derived indexes is not served: workers only load
+    second = save(["Kenya has 2,313 TVET institutions.", "Most youth study tailoring."], with_derived=False)
+    engine._reload(second)
+    assert engine.snapshot.version == first and engine.db.index.ntotal == 1
+
+    third = save(["Kenya has 2,313 TVET institutions.", "Most youth study tailoring."])
+    engine._reload(third)
+    assert engine.snapshot.version == third and engine.db.index.ntotal == 2
+    assert len(engine.sentence_index.chunk_rows) == 2
+
+def test_restoring_a_removed_file_whose_chunk_survived_as_a_duplicate(tmp_path):
+    pytest.importorskip("nltk")
+    fitz = pytest.importorskip("fitz")
+    from rag import create_or_load_faiss_index
+
+    shared = "Zizi Afrique works with partners to improve learning outcomes for children across Kenya."
+    docs_folder = tmp_path / "docs"
+    docs_folder.mkdir()
+    index_path = str(tmp_path / "index")
+
+    def write_pdf(name, pages):
+        pdf = fitz.open()
+        for text in pages:
+            pdf.new_page().insert_text((72, 72), text)
+        pdf.save(docs_folder / name)
+        return (docs_folder / name).read_bytes()
+
+    def sync():
+        return create_or_load_faiss_index(HashEmbeddings(), index_path, str(docs_folder), "hash", index_type="flat")
+
+    first = write_pdf("2022 report.pdf", [shared, "The 2022 report counted 2,313 TVET institutions."])
+    sync()
+    write_pdf("2023 report.pdf", [shared])
+    sync()
+    # The shared chunk keeps the id from the 2022 report after that file is gone...
+    (docs_folder / "2022 report.pdf").unlink()
+    sync()
+    # ...so restoring the same file yields that id again
+    (docs_folder / "2022 report.pdf").write_bytes(first)
+    db = sync()
+
+    texts = [db.docstore.search(i) for i in db.index_to_docstore_id.values()]
+    assert len(texts) == 2
+    kept = next(doc for doc in texts if doc.page_content == shared)
+    assert sorted(r["source"].split("/")[-1] for r in kept.metadata["sources"]) == ["2022 report.pdf", "2023 report.pdf"]
+
+def test_resumed_sync_drops_chunks_of_a_file_replaced_in_between(tmp_path):
+    pytest.importorskip("nltk")
+    fitz = pytest.importorskip("fitz")
+    from rag import create_or_load_faiss_index
+
+    docs_folder = tmp_path / "docs"
+    docs_folder.mkdir()
+    index_path = str(tmp_path / "index")
+
+    def write_pdf(name, text):
+        pdf = fitz.open()
+        pdf.new_page().insert_text((72, 72), text)
+        pdf.save(docs_folder / name)
+
+    def sync():
+        return create_or_load_faiss_index(HashEmbeddings(), index_path, str(docs_folder), "hash", index_type="flat")
+
+    write_pdf("2022 report.pdf", "The 2022 report counted 2,313 TVET institutions.")
+    sync()
+    # A sync of the first version of the 2023 report was interrupted after embedding it
+    checkpoint_path = checkpoint_path_for(index_path)
+    staged = stage_store(index_path, checkpoint_path, HashEmbeddings())
+    draft = [("2023 report.pdf:0123456789ab:0:0", chunk("A draft paragraph that was replaced.", "2023 report.pdf"))]
+    staged = add_chunks_streaming(staged, draft, HashEmbeddings())
+    save_checkpoint(staged, checkpoint_path, {draft[0][0]})
+    staged.docstore.close()
+
+    write_pdf("2023 report.pdf", "The 2023 report lists tailoring as the top course.")
+    db = sync()
+    chunk_ids = set(db.index_to_docstore_id.values())
+    assert len(chunk_ids) == 2 and draft[0][0] not in chunk_ids
+    assert chunk_ids == referenced_ids(load_manifest(index_path))
@@ -0,0 +1,39 @@
+import multiprocessing
+import metrics
+from metrics import Registry, _ProcessFile
+
+def test_shared_metrics_are_summed_over_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    monkeypatch.setattr(metrics, "_process_file", None)
+    registry = Registry()
+    queries = registry.counter("queries", "Queries.", labelnames=("tier",))
+    latency = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+
+    def worker():
+        queries.inc(2, tier="exact")
+        latency.observe(0.5)
+
+    queries.inc(tier="exact")
+    latency.observe(0.05)
+    child = multiprocessing.get_context("fork").Process(target=worker)
+    child.start()
+    child.join()
+    assert child.exitcode == 0
+
+    text = registry.render()
+    assert 'queries_total{tier="exact"} 3' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1.0"} 2' in text
+    assert "latency_seconds_count 2" in text
+    assert "worker=" not in text
+
+def test_process_file_grows_past_its_initial_size(tmp_path):
+    path = str(tmp_path / "1.metrics")
+    values = _ProcessFile(path)
+    keys = [f'["metric", ["label {i}"], null]' for i in range(3000)]
+    for key in keys:
+        values.add(key, 1.5)
+    values.add(keys[0], 1.0)
+    read = _ProcessFile.read(path)
+    assert len(read) == len(keys)
+    assert read[keys[0]] == 2.5 and read[keys[-1]] == 1.5
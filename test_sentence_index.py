@@ -0,0 +1,52 @@
+import json
+import numpy as np
+import pytest
+
+pytest.importorskip("nltk")
+from sentence_index import SENTENCES_FILE, SentenceIndex
+
+CHUNKS = [
+    ("tvet", "Kenya has 2,313 TVET institutions across the country. Most of them are public colleges."),
+    ("courses", "The most popular courses are tailoring and carpentry. Most of them are public colleges."),
+]
+
+
+class WordModel:
+    """Embeds a text as which of a few words it contains, normalized."""
+
+    WORDS = ("tvet", "public", "tailoring", "carpentry")
+
+    def encode(self, texts, normalize_embeddings=True, convert_to_numpy=True, **kwargs):
+        vectors = np.array([[float(w in t.lower()) for w in self.WORDS] for t in texts], dtype=np.float32) + 0.01
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def get_sentence_embedding_dimension(self):
+        return len(self.WORDS)
+
+def test_save_and_load_round_trip(tmp_path):
+    index = SentenceIndex.build(CHUNKS, WordModel(), "words")
+    index.save(tmp_path)
+    loaded = SentenceIndex.load(tmp_path, "words")
+
+    # The sentence shared by both chunks is stored once
+    assert len(loaded) == len(index) == 3
+    assert loaded.sentences == index.sentences
+    assert loaded.chunk_rows == index.chunk_rows
+    assert loaded.fallbacks == index.fallbacks
+    np.testing.assert_array_equal(loaded.embeddings, index.embeddings)
+    query = WordModel().encode(["tailoring"])[0]
+    assert loaded.top_sentences(query, ["courses"], n=1) == index.top_sentences(query, ["courses"], n=1)
+    assert "tailoring" in loaded.top_sentences(query, ["courses"], n=1)[0]
+
+def test_load_rejects_another_model(tmp_path):
+    SentenceIndex.build(CHUNKS, WordModel(), "words").save(tmp_path)
+    assert SentenceIndex.load(tmp_path, "other-model") is None
+
+def test_load_rejects_sentences_and_embeddings_of_different_saves(tmp_path):
+    SentenceIndex.build(CHUNKS, WordModel(), "words").save(tmp_path)
+    with open(tmp_path / SENTENCES_FILE, encoding="utf-8") as f:
+        data = json.load(f)
+    data["sentences"] = data["sentences"][:1]
+    with open(tmp_path / SENTENCES_FILE, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    assert SentenceIndex.load(tmp_path, "words") is None
@@ -0,0 +1,41 @@
+import re
+
+MULTI_NEWLINE_RE = re.compile(r'\n{2,}')
+SINGLE_NEWLINE_RE = re.compile(r'(?<!\n)\n(?!\n)')
+MULTI_SPACE_RE = re.compile(r' +')
+LIST_MARKER_RE = re.compile(r"^[\s\-–•]*([a-zA-Z0-9]{1,2})[\.\)]\s+")
+
+BOILERPLATE_LINE_RE = re.compile(r"www\.ziziafrique|info@ziziafrique|follow us|annual report|contents", re.IGNORECASE)
+NON_TEXT_LINE_RE = re.compile(r"[0-9\s\W]+")
+
+# Links, emails and page furniture; the scoped flag keeps "Follow us" & co. case-sensitive
+REJECT_SENTENCE_RE = re.compile(r"(?i:www\.|http)|@|Follow us|Annual Report|Contents")
+MIN_LETTERS_RE = re.compile(r"(?:[^a-zA-Z]*[a-zA-Z]){20}")
+MIN_WORDS_RE = re.compile(r"\s*\S+(?:\s+\S+){3}")
+
+def clean_text(text: str) -> str:
+    text = MULTI_NEWLINE_RE.sub('\n', text)
+    text = SINGLE_NEWLINE_RE.sub(' ', text)
+    text = MULTI_SPACE_RE.sub(' ', text)
+    lines = [line.strip() for line in text.split('\n')]
+    return '\n'.join(lines)
+
+def clean_sentence(sentence: str) -> str:
+    return LIST_MARKER_RE.sub("", sentence).strip()
+
+def remove_boilerplate(text: str) -> str:
+    cleaned = []
+    for line in text.split("\n"):
+        line = line.strip()
+        if BOILERPLATE_LINE_RE.search(line) or NON_TEXT_LINE_RE.fullmatch(line):
+            continue
+        cleaned.append(line)
+    return "\n".join(cleaned)
+
+def is_answer_sentence(sentence: str) -> bool:
+    """No links or page furniture, at least 20 letters and at least 4 words."""
+    return (
+        REJECT_SENTENCE_RE.search(sentence) is None
+        and MIN_LETTERS_RE.match(sentence) is not None
+        and MIN_WORDS_RE.match(sentence) is not None
+    )